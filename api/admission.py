@@ -0,0 +1,67 @@
+import json
+from typing import Tuple
+
+# Prefixes of the routes that call the upstream, shed first under load
+HEAVY_PATHS = ("/generate_text", "/translate", "/summarize", "/embed", "/search", "/ws/conversations")
+
+# Routes never shed, so load balancers can always read the admission state
+EXEMPT_PATHS = ("/health",)
+
+# WebSocket close code asking the client to try again later
+TRY_AGAIN_LATER = 1013
+
+
+class AdmissionMiddleware:
+    """Rejects new requests with 503 and Retry-After when the worker is overloaded.
+
+    Requests are admitted or rejected by the `LoadMonitor` found in
+    `app.state.load_monitor` before any other work is done, and counted as in
+    flight until their response is sent. WebSocket connections are only admitted
+    at the handshake and not counted, so idle sockets do not hold in-flight slots;
+    the conversation handler admits and counts each of their messages instead.
+    When no monitor is set the middleware only passes requests through.
+
+    Args:
+        app: The ASGI application.
+        heavy_paths (Tuple[str, ...]): Path prefixes of the routes shed first.
+        exempt_paths (Tuple[str, ...]): Paths never shed.
+    """
+
+    def __init__(self, app, heavy_paths: Tuple[str, ...] = HEAVY_PATHS, exempt_paths: Tuple[str, ...] = EXEMPT_PATHS):
+        self.app = app
+        self.heavy_paths = heavy_paths
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope, receive, send):
+        monitor = getattr(scope["app"].state, "load_monitor", None) if "app" in scope else None
+        if monitor is None or scope["type"] not in ("http", "websocket") or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        heavy = scope["path"].startswith(self.heavy_paths)
+        if not monitor.admit(heavy):
+            await self._reject(scope, send, monitor.retry_after)
+            return
+        if scope["type"] == "websocket":
+            await self.app(scope, receive, send)
+            return
+        with monitor.track(heavy):
+            await self.app(scope, receive, send)
+
+    async def _reject(self, scope, send, retry_after: int):
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": TRY_AGAIN_LATER})
+            return
+        body = json.dumps({"detail": "Service overloaded, retry later"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -1,18 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.dependencies import Depends
+from fastapi import Depends
 
 from .models import TextRequest, TranslationRequest, SummarizationRequest
 from .auth import authenticate_user, generate_jwt_token
 from .database import get_db, User
-from openai import OpenAI
 
-# Import OpenAI library with version 1.52.0
-openai = OpenAI()
-
-# Import configuration settings from config.py
-from .config import settings
+# Import configuration settings and the shared OpenAI client (version 1.52.0) from config.py
+from config.config import get_openai_client
+from utils.helpers import SUMMARY_PROMPT
+from utils.tokenizer import plan_completion
 
 app = FastAPI()
 
@@ -38,11 +36,14 @@ async def generate_text_endpoint(request: TextRequest):
         JSONResponse: A JSON response containing the generated text.
     """
     try:
+        # Size the completion from the prompt length and the model's context
+        budget = plan_completion(request.model, "generate", request.text)
+
         # Use the OpenAI library to generate text
-        response = openai.completions.create(
+        response = get_openai_client().completions.create(
             model=request.model,
             prompt=request.text,
-            max_tokens=1024,
+            max_tokens=budget.max_tokens,
             temperature=0.7,
             top_p=1.0,
             frequency_penalty=0.0,
@@ -72,7 +73,7 @@ async def translate_text_endpoint(request: TranslationRequest):
     """
     try:
         # Use the OpenAI library to translate text
-        response = openai.translations.create(
+        response = get_openai_client().translations.create(
             model="gpt-3.5-turbo",
             input=request.text,
             source_language=request.source_language,
@@ -101,11 +102,14 @@ async def summarize_text_endpoint(request: SummarizationRequest):
         JSONResponse: A JSON response containing the summarized text.
     """
     try:
+        # Size the summary in proportion to the text, within the model's context
+        budget = plan_completion(request.model, "summarize", SUMMARY_PROMPT, request.text, input_text=request.text)
+
         # Use the OpenAI library to summarize text
-        response = openai.completions.create(
+        response = get_openai_client().completions.create(
             model=request.model,
-            prompt=f"Summarize this text: {request.text}",
-            max_tokens=1024,
+            prompt=f"{SUMMARY_PROMPT}{request.text}",
+            max_tokens=budget.max_tokens,
             temperature=0.7,
             top_p=1.0,
             frequency_penalty=0.0,
@@ -181,8 +185,8 @@ async def startup_event():
 
     This event handler is called when the application starts.
     """
-    # Initialize the OpenAI library with the API key from settings.py
-    openai.api_key = settings.OPENAI_API_KEY
+    # Build the OpenAI client with the API key from the settings
+    get_openai_client()
 
     # Optionally initialize the database connection here
     # ...
@@ -0,0 +1,78 @@
+import json
+import time
+from typing import Any, Tuple
+
+# Routes whose traffic is archived for replay
+ARCHIVED_PATHS = ("/generate_text", "/translate", "/summarize")
+
+# Bodies larger than this are archived truncated
+MAX_ARCHIVED_BODY = 1024 * 1024
+
+# Upstream model used when the request has no `model` field, as defaulted by the request models
+DEFAULT_MODELS = {"/generate_text": "text-davinci-003", "/translate": "gpt-3.5-turbo", "/summarize": "text-davinci-003"}
+
+
+class ArchiveMiddleware:
+    """Records the request, response, timing and model of the archived routes.
+
+    Records go to the `ArchiveWriter` found in `app.state.archive_writer`; when
+    none is set the middleware only passes requests through.
+
+    Args:
+        app: The ASGI application.
+        paths (Tuple[str, ...]): Paths of the archived routes.
+    """
+
+    def __init__(self, app, paths: Tuple[str, ...] = ARCHIVED_PATHS):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        writer = getattr(scope["app"].state, "archive_writer", None) if "app" in scope else None
+        if writer is None or scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        started_at, started = time.time(), time.perf_counter()
+        request_body, response_body = bytearray(), bytearray()
+        status = 500
+
+        async def archiving_receive():
+            message = await receive()
+            if message["type"] == "http.request" and len(request_body) <= MAX_ARCHIVED_BODY:
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def archiving_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and len(response_body) <= MAX_ARCHIVED_BODY:
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, archiving_receive, archiving_send)
+        finally:
+            request = _decode(request_body)
+            writer.record(
+                {
+                    "ts": started_at,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "model": request.get("model", DEFAULT_MODELS.get(scope["path"])) if isinstance(request, dict) else None,
+                    "request": request,
+                    "status": status,
+                    "response": _decode(response_body),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "truncated": len(request_body) > MAX_ARCHIVED_BODY or len(response_body) > MAX_ARCHIVED_BODY,
+                }
+            )
+
+
+def _decode(body: bytearray) -> Any:
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode("utf-8", errors="replace")
@@ -1,16 +1,15 @@
-from fastapi import HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from .database import get_db
-from .models import User
-import os
+from .database import get_db, User
+from config.config import get_settings
+from utils.helpers import hash_password
+import hmac
 import jwt
 from datetime import datetime, timedelta
 
-# Configuration Settings
-SECRET_KEY = os.environ.get("SECRET_KEY")
-if not SECRET_KEY:
-    raise ValueError("SECRET_KEY environment variable not set")
+# Authentication routes, included by the application
+router = APIRouter()
 
 # Authentication Scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -22,12 +21,12 @@ def generate_jwt_token(username: str) -> str:
         "iat": datetime.utcnow(),
         "exp": datetime.utcnow() + timedelta(minutes=30)
     }
-    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+    return jwt.encode(payload, get_settings().SECRET_KEY, algorithm="HS256")
 
 # JWT Token Verification
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = jwt.decode(token, get_settings().SECRET_KEY, algorithms=["HS256"])
         username = payload.get("sub")
         if not username:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -45,12 +44,12 @@ async def authenticate_user(username: str, password: str, db: Session = Depends(
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
-    if not user.verify_password(password):
+    if not hmac.compare_digest(user.password, hash_password(password)):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
     return user
 
 # Authentication Route
-@app.post("/login", response_model=dict, responses={400: {"model": "Bad Request"}})
+@router.post("/login", response_model=dict, responses={400: {"description": "Bad Request"}})
 async def login_endpoint(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
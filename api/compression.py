@@ -0,0 +1,253 @@
+import json
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import zstandard
+from fastapi import HTTPException
+
+from config.config import get_settings
+
+# Content types worth compressing; everything else (images, archives) is passed through
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
+
+
+class CompressionPolicy(NamedTuple):
+    """Per-route compression settings, None falls back to the defaults from the settings."""
+
+    level: Optional[int] = None
+    minimum_size: Optional[int] = None
+
+
+class GzipEncoder:
+    """Incremental gzip encoder."""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(max(1, min(level, 9)), zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class ZstdEncoder:
+    """Incremental zstd encoder, several times faster than gzip at a similar ratio."""
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=max(1, min(level, 19))).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# Encoders in server preference order
+ENCODERS = {"zstd": ZstdEncoder, "gzip": GzipEncoder}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks the preferred encoding accepted by the client.
+
+    Args:
+        accept_encoding (str): The value of the Accept-Encoding header.
+
+    Returns:
+        Optional[str]: The encoding to use, or None to send the body as is.
+    """
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip()] = quality
+
+    candidates = [(accepted.get(name, accepted.get("*", 0.0)), -index, name) for index, name in enumerate(ENCODERS)]
+    quality, _, name = max(candidates)
+    return name if quality > 0 else None
+
+
+class CompressionMiddleware:
+    """Compresses responses and decompresses gzip request bodies.
+
+    Responses are compressed with the best encoding the client accepts when their
+    content type is compressible and they are larger than the minimum size.
+    Streamed responses are compressed chunk by chunk, and every chunk is flushed
+    immediately so clients are not held back by the encoder's buffer.
+
+    Args:
+        app: The ASGI application.
+        routes (Optional[Dict[str, CompressionPolicy]]): Policies by path prefix, the longest match wins.
+    """
+
+    def __init__(self, app, routes: Optional[Dict[str, CompressionPolicy]] = None):
+        self.app = app
+        self.routes = sorted((routes or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def policy_for(self, path: str) -> Tuple[int, int]:
+        settings = get_settings()
+        level, minimum_size = settings.COMPRESSION_LEVEL, settings.COMPRESSION_MINIMUM_SIZE
+        for prefix, policy in self.routes:
+            if path.startswith(prefix):
+                if policy.level is not None:
+                    level = policy.level
+                if policy.minimum_size is not None:
+                    minimum_size = policy.minimum_size
+                break
+        return level, minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = _Headers(scope["headers"])
+        request_encoding = headers.get(b"content-encoding", b"").strip().lower()
+        if request_encoding in (b"gzip", b"x-gzip"):
+            scope = dict(scope, headers=headers.without(b"content-encoding", b"content-length"))
+            receive = _decompressing_receive(receive, get_settings().MAX_DECOMPRESSED_REQUEST_SIZE)
+
+        encoding = negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        responder = _CompressingResponder(send, encoding, *self.policy_for(scope["path"]))
+        try:
+            await self.app(scope, receive, responder.send)
+        except HTTPException as e:
+            # Raised by the decompressing receive outside of a route's exception handling
+            await responder.reject(e.status_code, e.detail)
+
+
+class _Headers:
+    def __init__(self, raw: List[Tuple[bytes, bytes]]):
+        self.raw = list(raw)
+
+    def get(self, name: bytes, default: bytes = b"") -> bytes:
+        for key, value in self.raw:
+            if key.lower() == name:
+                return value
+        return default
+
+    def without(self, *names: bytes) -> List[Tuple[bytes, bytes]]:
+        return [(key, value) for key, value in self.raw if key.lower() not in names]
+
+
+def _decompressing_receive(receive, max_size: int):
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    total = 0
+
+    async def wrapped():
+        nonlocal total
+        message = await receive()
+        if message["type"] != "http.request":
+            return message
+        try:
+            # Bound the output of every call so a small compressed chunk cannot expand past the limit
+            body = decompressor.decompress(message.get("body", b""), max_size - total + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip request body: {e}")
+        total += len(body)
+        if total > max_size or decompressor.unconsumed_tail:
+            raise HTTPException(status_code=413, detail=f"Decompressed request body exceeds {max_size} bytes")
+        if not message.get("more_body", False) and not decompressor.eof:
+            raise HTTPException(status_code=400, detail="Invalid gzip request body: truncated stream")
+        return dict(message, body=body)
+
+    return wrapped
+
+
+class _CompressingResponder:
+    def __init__(self, send, encoding: Optional[str], level: int, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.encoder = None
+        self.started = False
+        self.passthrough = encoding is None
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.started = True
+            headers = _Headers(message.get("headers", []))
+            content_type = headers.get(b"content-type").decode("latin-1").lower()
+            if (
+                self.passthrough
+                or headers.get(b"content-encoding")
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                self.passthrough = True
+                await self._send(message)
+                return
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+            self.encoder = ENCODERS[self.encoding](self.level)
+            headers = _Headers(start.get("headers", []))
+            vary = headers.get(b"vary")
+            compressed_headers = headers.without(b"content-length", b"vary") + [
+                (b"content-encoding", self.encoding.encode()),
+                (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+            ]
+            if not more_body:
+                body = self.encoder.compress(body) + self.encoder.finish()
+                compressed_headers.append((b"content-length", str(len(body)).encode()))
+                await self._send(dict(start, headers=compressed_headers))
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            await self._send(dict(start, headers=compressed_headers))
+
+        chunk = self.encoder.compress(body)
+        if not more_body:
+            chunk += self.encoder.finish()
+        elif body:
+            # The application sends a chunk when it has one, e.g. each translated part of a document
+            chunk += self.encoder.flush()
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def reject(self, status_code: int, detail: str):
+        if self.started:
+            raise RuntimeError(detail)
+        body = json.dumps({"detail": detail}).encode()
+        await self._send(
+            {
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            }
+        )
+        await self._send({"type": "http.response.body", "body": body})
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from contextlib import nullcontext
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from .models import TextRequest
+from utils.load_monitor import LoadMonitor
+from utils.sessions import ConversationManager
+
+
+async def serve_conversations(
+    websocket: WebSocket, manager: ConversationManager, max_pending: int = 8, monitor: Optional[LoadMonitor] = None
+):
+    """Runs the conversation protocol on a WebSocket.
+
+    The socket gets a conversation of its own, announced as
+    `{"type": "session", "session_id": ...}`; `?session_id=` resumes an existing one.
+    Clients send `{"id": ..., "text": ..., "model": ..., "session_id": ...}` messages,
+    where `session_id` defaults to the socket's conversation. Several messages can
+    be in flight at once, up to `max_pending`: their replies are streamed back
+    interleaved as `{"type": "delta", "id": ..., "text": ...}` and end with
+    `{"type": "done", "id": ...}` or `{"type": "error", "id": ..., "detail": ...}`.
+    Messages beyond `max_pending` are answered with an error at once.
+
+    Every message goes through admission control like an LLM request: it is
+    counted as in flight while its reply is generated, and rejected with an
+    error carrying `retry_after` when the worker is overloaded.
+
+    Args:
+        websocket (WebSocket): The WebSocket connection.
+        manager (ConversationManager): The conversation manager.
+        max_pending (int): Largest number of messages of the socket in flight.
+        monitor (Optional[LoadMonitor]): Admits and counts the messages, if set.
+    """
+    await websocket.accept()
+    conversation = await manager.open(websocket.query_params.get("session_id"))
+    send_lock = asyncio.Lock()
+    tasks = set()
+
+    async def send(message):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def handle(message):
+        request_id = message.get("id")
+        session_id = message.get("session_id") or conversation.id
+        try:
+            request = TextRequest(text=message.get("text", ""), model=message.get("model", "text-davinci-003"))
+            with monitor.track(True) if monitor is not None else nullcontext():
+                async for delta in manager.reply(session_id, request.text, request.model):
+                    await send({"type": "delta", "id": request_id, "session_id": session_id, "text": delta})
+            await send({"type": "done", "id": request_id, "session_id": session_id})
+        except (ValidationError, KeyError, ValueError) as e:
+            await send({"type": "error", "id": request_id, "detail": f"Invalid message: {e}"})
+        except Exception as e:
+            await send({"type": "error", "id": request_id, "detail": f"Error generating text: {e}"})
+
+    await send({"type": "session", "session_id": conversation.id})
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError as e:
+                await send({"type": "error", "id": None, "detail": f"Invalid message: {e}"})
+                continue
+            if not isinstance(message, dict):
+                await send({"type": "error", "id": None, "detail": "Invalid message: expected a JSON object"})
+                continue
+            if monitor is not None and not monitor.admit(True):
+                await send(
+                    {
+                        "type": "error",
+                        "id": message.get("id"),
+                        "detail": "Service overloaded, retry later",
+                        "retry_after": monitor.retry_after,
+                    }
+                )
+                continue
+            if len(tasks) >= max_pending:
+                await send({"type": "error", "id": message.get("id"), "detail": f"Too many messages in flight, at most {max_pending}"})
+                continue
+            task = asyncio.create_task(handle(message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        for task in tasks:
+            task.cancel()
+        # Wait for the cancelled replies, so their in-flight counts are released
+        await asyncio.gather(*tasks, return_exceptions=True)
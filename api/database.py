@@ -1,27 +1,36 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.dependencies import Depends
+from fastapi import Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, insert, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import os
-from .config import settings  # Import settings from config.py
+from config.config import ReloadableResource  # Import settings helpers from config.py
 import openai  # Import OpenAI library with version 1.52.0
 from .models import User  # Import User model from models.py
 
 
-# Define a global variable for the database connection
-engine = create_engine(settings.DATABASE_URL)  # Create an engine using the database URL from settings.py
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)  # Create a sessionmaker
+# Define a global holder for the database connection, rebuilt only when DATABASE_URL changes
+_engine = ReloadableResource(
+    ("DATABASE_URL",),
+    lambda s: create_engine(s.DATABASE_URL),  # Create an engine using the database URL from settings
+    dispose=lambda engine: engine.dispose(),  # Checked-out connections are closed when they are returned
+)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)  # Create a sessionmaker, bound per session
 Base = declarative_base()  # Create a base for declarative models
 
 
+# Function to get the engine for the current settings
+def get_engine():
+    return _engine.get()
+
+
 # Define a dependency function to get the database session
 def get_db():
-    db = SessionLocal()  # Create a database session
+    db = SessionLocal(bind=get_engine())  # Create a database session on the current engine
     try:
         yield db  # Yield the database session
     finally:
@@ -87,5 +96,31 @@ def get_all_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(User).offset(skip).limit(limit).all()  # Query the database for all users
 
 
+# Function to get the page of users following the given ID (keyset pagination on the primary key)
+def get_users_after(db: Session, after_id: Optional[int] = None, limit: int = 100):
+    query = db.query(User)
+    if after_id is not None:
+        query = query.filter(User.id > after_id)  # Seek on the primary key index instead of scanning skipped rows
+    return query.order_by(User.id).limit(limit).all()
+
+
+# Function to iterate over all users in batches through a server-side cursor
+def iter_user_batches(db: Session, batch_size: int = 1000) -> Iterator[List[Tuple[int, str]]]:
+    result = db.execute(
+        select(User.id, User.username)
+        .order_by(User.id)
+        .execution_options(stream_results=True, yield_per=batch_size)  # Fetch rows in batches of batch_size
+    )
+    for partition in result.partitions():
+        yield partition
+
+
+# Function to insert a batch of users with a single executemany
+def bulk_insert_users(db: Session, users: List[Dict[str, Any]]) -> int:
+    if users:
+        db.execute(insert(User), users)  # Use the ORM bulk INSERT path, no per-object bookkeeping
+    return len(users)
+
+
 # Initialize the database
-Base.metadata.create_all(bind=engine)  # Create all database tables defined in the models
\ No newline at end of file
+Base.metadata.create_all(bind=get_engine())  # Create all database tables defined in the models
\ No newline at end of file
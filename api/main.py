@@ -1,15 +1,95 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.dependencies import Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import Depends
 from sqlalchemy.orm import Session
+from typing import Optional
+import asyncio
+import json
+import numpy as np
 
-from .models import TextRequest, TranslationRequest, SummarizationRequest
-from .api import generate_text, translate_text, summarize_text
-from .auth import authenticate_user, generate_jwt_token
-from .database import get_db, User
+# For logging
+import structlog
+
+from .models import TextRequest, TranslationRequest, SummarizationRequest, EmbeddingRequest, SearchRequest
+from .admission import AdmissionMiddleware
+from .archive import ArchiveMiddleware
+from .auth import get_current_user, router as auth_router
+from .conversations import serve_conversations
+from .compression import CompressionMiddleware, CompressionPolicy
+from .database import get_db, get_engine, get_users_after, iter_user_batches, bulk_insert_users, SessionLocal, User
+from config.config import get_redis_client, get_settings, settings_provider
+from utils.archive import ArchiveWriter
+from utils.batching import MicroBatcher
+from utils.cache_warming import CacheWarmer, MemoryCache
+from utils.embeddings import embed_unique, text_id
+from utils.documents import chunk_size_for, spool_upload, summarize_document, translate_document
+from utils.sessions import ConversationManager, InMemorySessionStore, RedisSessionStore
+from utils.vector_store import VectorStore
+from utils.load_monitor import LoadMonitor
+from utils.logger import setup_logging
+from utils.tokenizer import load_tokenizers
+from utils.helpers import hash_password, generate_text, translate_text, translate_texts, summarize_text, iter_ndjson
+
+logger = structlog.get_logger()
 
 app = FastAPI()
+app.include_router(auth_router)
+background_tasks = []
+
+USER_EXPORT_BATCH_SIZE = 1000
+USER_IMPORT_BATCH_SIZE = 5000
+
+# Concurrent translations for the same language pair share one upstream request
+async def _translate_batch(languages, texts):
+    return await run_in_threadpool(translate_texts, texts, *languages)
+
+async def _translate_one(languages, text):
+    return await run_in_threadpool(translate_text, text, *languages)
+
+def _configure_translation_batcher(old, new):
+    translation_batcher.configure(new.TRANSLATE_BATCH_WINDOW, new.TRANSLATE_BATCH_MAX_SIZE, new.TRANSLATE_BATCH_TOKEN_BUDGET)
+
+translation_batcher = MicroBatcher(_translate_batch, _translate_one)
+settings_provider.subscribe(
+    ("TRANSLATE_BATCH_WINDOW", "TRANSLATE_BATCH_MAX_SIZE", "TRANSLATE_BATCH_TOKEN_BUDGET"),
+    _configure_translation_batcher,
+)
+
+# Concurrent embedding inputs share one upstream request, and repeated texts are embedded once
+async def _embed_batch(model, texts):
+    return await run_in_threadpool(embed_unique, texts)
+
+async def _embed_one(model, text):
+    return (await run_in_threadpool(embed_unique, [text]))[0]
+
+def _configure_embedding_batcher(old, new):
+    embedding_batcher.configure(new.EMBED_BATCH_WINDOW, new.EMBED_BATCH_MAX_SIZE, new.EMBED_BATCH_TOKEN_BUDGET)
+
+embedding_batcher = MicroBatcher(_embed_batch, _embed_one)
+settings_provider.subscribe(
+    ("EMBED_BATCH_WINDOW", "EMBED_BATCH_MAX_SIZE", "EMBED_BATCH_TOKEN_BUDGET"),
+    _configure_embedding_batcher,
+)
+
+def _configure_response_cache(old, new):
+    if getattr(app.state, "response_cache", None) is not None:
+        app.state.response_cache.configure(new.CACHE_TTL, new.CACHE_STALE_TTL, new.CACHE_REFRESH_AHEAD, new.CACHE_REFRESH_BUDGET)
+
+settings_provider.subscribe(
+    ("CACHE_TTL", "CACHE_STALE_TTL", "CACHE_REFRESH_AHEAD", "CACHE_REFRESH_BUDGET"),
+    _configure_response_cache,
+)
+
+def _configure_load_monitor(old, new):
+    if getattr(app.state, "load_monitor", None) is not None:
+        app.state.load_monitor.configure(new.ADMISSION_MAX_LAG, new.ADMISSION_MAX_IN_FLIGHT, new.ADMISSION_CRITICAL_LAG)
+
+settings_provider.subscribe(
+    ("ADMISSION_MAX_LAG", "ADMISSION_MAX_IN_FLIGHT", "ADMISSION_CRITICAL_LAG"),
+    _configure_load_monitor,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,41 +99,183 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/generate_text", response_model=TextRequest, responses={400: {"model": "Bad Request"}})
+# Added before compression so it sees uncompressed bodies
+app.add_middleware(ArchiveMiddleware)
+
+app.add_middleware(
+    CompressionMiddleware,
+    routes={
+        "/users/export": CompressionPolicy(level=1, minimum_size=0),  # Large streamed output, favour CPU
+        "/users/": CompressionPolicy(minimum_size=4096),
+    },
+)
+
+# Added last so overloaded workers reject requests before doing any other work
+app.add_middleware(AdmissionMiddleware)
+
+@app.get("/health")
+async def health_endpoint():
+    monitor = app.state.load_monitor
+    status = monitor.status()
+    if monitor.overloaded:
+        return JSONResponse(content=status, status_code=503, headers={"Retry-After": str(monitor.retry_after)})
+    return status
+
+@app.post("/generate_text", response_model=TextRequest, responses={400: {"description": "Bad Request"}})
 async def generate_text_endpoint(request: TextRequest):
     try:
-        text = await generate_text(request.text, request.model)
+        text = await app.state.response_cache.get("generate_text", {"text": request.text, "model": request.model})
         return {"text": text}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error generating text: {e}")
 
-@app.post("/translate", response_model=TranslationRequest, responses={400: {"model": "Bad Request"}})
+@app.post("/translate", response_model=TranslationRequest, responses={400: {"description": "Bad Request"}})
 async def translate_text_endpoint(request: TranslationRequest):
     try:
-        translation = await translate_text(request.text, request.source_language, request.target_language)
+        translation = await translation_batcher.submit((request.source_language, request.target_language), request.text)
         return {"translation": translation}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error translating text: {e}")
 
-@app.post("/summarize", response_model=SummarizationRequest, responses={400: {"model": "Bad Request"}})
+@app.post("/summarize", response_model=SummarizationRequest, responses={400: {"description": "Bad Request"}})
 async def summarize_text_endpoint(request: SummarizationRequest):
     try:
-        summary = await summarize_text(request.text, request.model)
+        summary = await app.state.response_cache.get("summarize", {"text": request.text, "model": request.model})
+        return {"summary": summary}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error summarizing text: {e}")
+
+# Documents of any size, uploaded as a multipart `file` field or as the raw body
+@app.post("/summarize/upload", responses={400: {"description": "Bad Request"}, 413: {"description": "Payload Too Large"}})
+async def summarize_upload_endpoint(request: Request, model: str = "text-davinci-003"):
+    settings = get_settings()
+    try:
+        SummarizationRequest(text="", model=model)
+        document = await spool_upload(request, settings.UPLOAD_MAX_BYTES, settings.UPLOAD_SPOOL_MEMORY)
+        try:
+            max_chars = chunk_size_for(model, settings.UPLOAD_CHUNK_CHARS)
+            summary = await summarize_document(document, model, max_chars, settings.UPLOAD_CONCURRENCY)
+        finally:
+            document.close()
         return {"summary": summary}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error summarizing text: {e}")
 
-@app.post("/login", response_model=str, responses={400: {"model": "Bad Request"}})
-async def login_endpoint(user_data: User):
+@app.post("/translate/upload", responses={400: {"description": "Bad Request"}, 413: {"description": "Payload Too Large"}})
+async def translate_upload_endpoint(request: Request, source_language: str, target_language: str):
+    settings = get_settings()
+    try:
+        TranslationRequest(text="", source_language=source_language, target_language=target_language)
+        document = await spool_upload(request, settings.UPLOAD_MAX_BYTES, settings.UPLOAD_SPOOL_MEMORY)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error translating text: {e}")
+
+    translations = translate_document(
+        document, source_language, target_language, settings.UPLOAD_CHUNK_CHARS, settings.UPLOAD_CONCURRENCY
+    )
+    # Translate the first chunk before answering, so upstream errors still get a status code
+    try:
+        first = await translations.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    except Exception as e:
+        document.close()
+        raise HTTPException(status_code=400, detail=f"Error translating text: {e}")
+
+    async def stream():
+        try:
+            yield first
+            async for translation in translations:
+                yield translation
+        finally:
+            await translations.aclose()
+            document.close()
+
+    return StreamingResponse(stream(), media_type="text/plain; charset=utf-8")
+
+@app.post("/embed", responses={400: {"description": "Bad Request"}})
+async def embed_endpoint(request: EmbeddingRequest):
+    try:
+        vectors = await embedding_batcher.submit_many(get_settings().EMBEDDING_MODEL, request.texts)
+        ids = request.ids or [text_id(text) for text in request.texts]
+        if request.store:
+            await run_in_threadpool(app.state.vector_store.add, ids, np.stack(vectors))
+        return {"embeddings": [{"id": vector_id, "embedding": vector.tolist()} for vector_id, vector in zip(ids, vectors)]}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error embedding text: {e}")
+
+@app.post("/search", responses={400: {"description": "Bad Request"}})
+async def search_endpoint(request: SearchRequest):
+    try:
+        query = await embedding_batcher.submit(get_settings().EMBEDDING_MODEL, request.query)
+        results = await run_in_threadpool(app.state.vector_store.search, query, request.k)
+        return {"results": [{"id": vector_id, "score": score} for vector_id, score in results]}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error searching: {e}")
+
+@app.websocket("/ws/conversations")
+async def conversations_endpoint(websocket: WebSocket):
+    await serve_conversations(
+        websocket, app.state.conversations, max_pending=get_settings().SESSION_MAX_PENDING, monitor=app.state.load_monitor
+    )
+
+@app.get("/users")
+async def list_users(
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    users = get_users_after(db, after, limit)
+    next_after = users[-1].id if len(users) == limit else None
+    return {"users": [{"id": user.id, "username": user.username} for user in users], "next_after": next_after}
+
+@app.get("/users/export")
+async def export_users(current_user: User = Depends(get_current_user)):
+    def stream():
+        # The session outlives the request handler, so it is owned by the generator
+        db = SessionLocal(bind=get_engine())
+        try:
+            for batch in iter_user_batches(db, USER_EXPORT_BATCH_SIZE):
+                yield "".join(json.dumps({"id": user_id, "username": username}) + "\n" for user_id, username in batch)
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/users/import")
+async def import_users(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    imported, batch = 0, []
     try:
-        user = await authenticate_user(user_data.username, user_data.password)
-        if user:
-            token = generate_jwt_token(user.username)
-            return JSONResponse(content={"access_token": token}, status_code=200)
-        else:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        async for record in iter_ndjson(request.stream()):
+            if not isinstance(record, dict) or not isinstance(record.get("username"), str) or not isinstance(record.get("password"), str):
+                raise ValueError(f"Record {imported + len(batch) + 1} must have string username and password")
+            batch.append({"username": record["username"], "password": hash_password(record["password"])})
+            if len(batch) >= USER_IMPORT_BATCH_SIZE:
+                imported += await run_in_threadpool(bulk_insert_users, db, batch)
+                batch = []
+        imported += await run_in_threadpool(bulk_insert_users, db, batch)
+        await run_in_threadpool(db.commit)
+        return {"imported": imported}
+    except HTTPException:
+        # Keeps the status of errors raised while reading the body, e.g. 413 from the gzip limit
+        db.rollback()
+        raise
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Error importing users: {e}")
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error during login: {e}")
+        # Database errors quote the inserted rows, passwords included, so they are only logged
+        db.rollback()
+        logger.error(f"Error importing users: {type(e).__name__}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error importing users: could not store records {imported + 1} to {imported + len(batch)}",
+        )
 
 @app.get("/users/{user_id}")
 async def get_user(user_id: int, db: Session = Depends(get_db)):
@@ -65,10 +287,63 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
 
 @app.on_event("startup")
 async def startup_event():
-    # Initialize database connection (if needed)
-    # ...
+    # Reload settings on SIGHUP or when the .env file changes, without restarting the worker
+    settings_provider.install_signal_handler(asyncio.get_running_loop())
+    setup_logging()
+    # Tokenizers may be downloaded on first use, which must not happen on the event loop
+    await run_in_threadpool(load_tokenizers)
+    settings = get_settings()
+    app.state.load_monitor = LoadMonitor()
+    _configure_load_monitor(None, settings)
+    background_tasks.append(asyncio.create_task(app.state.load_monitor.run()))
+    _configure_translation_batcher(None, settings)
+    _configure_embedding_batcher(None, settings)
+    interval = settings.SETTINGS_WATCH_INTERVAL
+    if interval > 0:
+        background_tasks.append(asyncio.create_task(settings_provider.watch(interval)))
+
+    # Keep conversation sessions in Redis when configured, shared by all workers, otherwise in memory
+    if settings.SESSION_STORE == "redis" and get_redis_client() is not None:
+        store = RedisSessionStore(get_redis_client, idle_ttl=settings.SESSION_IDLE_TTL)
+    else:
+        store = InMemorySessionStore(max_bytes=settings.SESSION_MAX_BYTES, idle_ttl=settings.SESSION_IDLE_TTL)
+    app.state.conversations = ConversationManager(
+        store, context_tokens=settings.SESSION_CONTEXT_TOKENS, keep_turns=settings.SESSION_KEEP_TURNS
+    )
+    background_tasks.append(asyncio.create_task(app.state.conversations.sweep(60.0)))
+
+    # Archive LLM route traffic for replay, if enabled
+    if settings.ARCHIVE_DIR:
+        app.state.archive_writer = ArchiveWriter(
+            settings.ARCHIVE_DIR, segment_size=settings.ARCHIVE_SEGMENT_SIZE, queue_size=settings.ARCHIVE_QUEUE_SIZE
+        )
+        app.state.archive_writer.start()
+
+    app.state.vector_store = VectorStore(settings.VECTOR_STORE_DIR, settings.VECTOR_SEARCH_PARTITION_BYTES)
+
+    # Cache /generate_text and /summarize results, keeping the popular ones warm
+    if settings.CACHE_BACKEND == "redis" and get_redis_client() is not None:
+        get_cache = get_redis_client
+    else:
+        memory_cache = MemoryCache(max_entries=settings.CACHE_MAX_ENTRIES)
+        get_cache = lambda: memory_cache
+    app.state.response_cache = CacheWarmer(
+        get_cache, hot_keys=settings.CACHE_HOT_KEYS, snapshot_path=settings.CACHE_SNAPSHOT_PATH
+    )
+    _configure_response_cache(None, settings)
+    app.state.response_cache.register("generate_text", generate_text)
+    app.state.response_cache.register("summarize", summarize_text)
+    background_tasks.append(asyncio.create_task(app.state.response_cache.prewarm()))
+    background_tasks.append(asyncio.create_task(app.state.response_cache.run()))
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Close database connection (if needed)
-    # ...
\ No newline at end of file
+    if getattr(app.state, "archive_writer", None) is not None:
+        await app.state.archive_writer.close()
+    if getattr(app.state, "vector_store", None) is not None:
+        app.state.vector_store.close()
+    if getattr(app.state, "response_cache", None) is not None:
+        await app.state.response_cache.close()
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, validator
+from typing import List, Optional
 
 class TextRequest(BaseModel):
     text: str
@@ -41,6 +42,33 @@ class SummarizationRequest(BaseModel):
             raise ValueError("Invalid model. Choose from: " + ", ".join(valid_models))
         return value
 
+class EmbeddingRequest(BaseModel):
+    texts: List[str]
+    ids: Optional[List[str]] = None  # IDs in the vector store, default to a hash of each text
+    store: bool = True  # Add the embeddings to the vector store
+
+    @validator("texts")
+    def texts_validation(cls, value):
+        if not 1 <= len(value) <= 2048:
+            raise ValueError("Provide between 1 and 2048 texts")
+        return value
+
+    @validator("ids")
+    def ids_validation(cls, value, values):
+        if value is not None and len(value) != len(values.get("texts", [])):
+            raise ValueError("Provide one ID per text")
+        return value
+
+class SearchRequest(BaseModel):
+    query: str
+    k: int = 10  # Number of results
+
+    @validator("k")
+    def k_validation(cls, value):
+        if not 1 <= value <= 1000:
+            raise ValueError("k must be between 1 and 1000")
+        return value
+
 class User(BaseModel):
     username: str
     password: str
\ No newline at end of file
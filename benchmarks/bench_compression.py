@@ -0,0 +1,81 @@
+"""Benchmarks response compression: bandwidth saved against CPU cost per response.
+
+Runs the encoders used by `api.compression.CompressionMiddleware` over payloads
+shaped like the service's responses: a generated text, a long summary and an
+NDJSON user export, and reports the compressed size and CPU time per response
+for every codec and level.
+
+Usage:
+    python benchmarks/bench_compression.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+from api.compression import ENCODERS  # noqa: E402
+
+WORDS = (
+    "the model text language summary data user request response system process time people way year day "
+    "information service result example number part problem place case point fact group company question "
+    "work government week program world area development report level history research change power "
+    "quick brown fox lazy dog jumps over under between after before during without within artificial "
+    "intelligence network training learning generation translation context token output input quality"
+).split()
+
+
+def generated_text(tokens: int, rng: random.Random) -> str:
+    words = []
+    for index in range(tokens):
+        word = rng.choice(WORDS)
+        words.append(word.capitalize() if index % 14 == 0 else word)
+        if index % 14 == 13:
+            words[-1] += "."
+    return " ".join(words)
+
+
+def payloads(rng: random.Random):
+    yield "generate_text (1k tokens)", json.dumps({"text": generated_text(1000, rng)}).encode()
+    yield "summarize (4k tokens)", json.dumps({"summary": generated_text(4000, rng)}).encode()
+    export = "".join(json.dumps({"id": i, "username": f"user{rng.randrange(10**8)}"}) + "\n" for i in range(100_000))
+    yield "users/export (100k rows)", export.encode()
+
+
+def encode(encoding: str, level: int, body: bytes, chunk_size: int) -> int:
+    encoder = ENCODERS[encoding](level)
+    size = 0
+    for start in range(0, len(body), chunk_size):
+        size += len(encoder.compress(body[start:start + chunk_size]))
+    return size + len(encoder.finish())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'payload':<26} {'codec':<8} {'bytes':>10} {'saved':>7} {'cpu ms':>8} {'MB/s':>8}")
+    for name, body in payloads(rng):
+        print(f"{name:<26} {'identity':<8} {len(body):>10} {'0.0%':>7} {0:>8.3f} {'-':>8}")
+        chunk_size = 64 * 1024 if len(body) > 1024 * 1024 else len(body)
+        for encoding, level in (("gzip", 1), ("gzip", 6), ("gzip", 9), ("zstd", 1), ("zstd", 3), ("zstd", 10)):
+            repeat = max(1, args.repeat if len(body) < 1024 * 1024 else args.repeat // 10)
+            start = time.process_time()
+            for _ in range(repeat):
+                size = encode(encoding, level, body, chunk_size)
+            cpu = (time.process_time() - start) / repeat
+            saved = 1 - size / len(body)
+            label = f"{encoding}-{level}"
+            print(f"{'':<26} {label:<8} {size:>10} {saved:>7.1%} {cpu * 1000:>8.3f} {len(body) / cpu / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
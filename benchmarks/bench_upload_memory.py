@@ -0,0 +1,103 @@
+"""Benchmarks peak memory of summarizing large documents: buffered JSON body against streamed upload.
+
+The buffered path is what `/summarize` does with a JSON body: the whole request is
+read and parsed before the text is used. The streamed path is `/summarize/upload`:
+the body is spooled to a temporary file and summarized chunk by chunk. Upstream
+calls are replaced by a stub, so only the memory and CPU cost of the service is
+measured. Every case runs in a fresh process, and its peak RSS is reported above
+the RSS of the process once imports are done.
+
+Usage:
+    python benchmarks/bench_upload_memory.py --sizes 10 50 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+from utils.documents import spool_stream, summarize_document  # noqa: E402
+
+PARAGRAPH = (
+    "The quick brown fox jumps over the lazy dog. Language models turn a prompt into text, one token at a time. "
+    "Long documents are split into chunks that fit in the context of the model!\n\n"
+)
+RECEIVE_SIZE = 64 * 1024
+CHUNK_CHARS = 8000
+
+
+async def body_chunks(size: int, as_json: bool = False):
+    """Yields a body of about `size` bytes in the chunk size of an ASGI server."""
+    text = PARAGRAPH * (RECEIVE_SIZE // len(PARAGRAPH))
+    block = (json.dumps(text)[1:-1] if as_json else text).encode()
+    yield b'{"text": "' if as_json else b""
+    for _ in range(size // len(block)):
+        yield block
+    yield b'"}' if as_json else b""
+
+
+def summarize_stub(text: str, model: str) -> str:
+    return text[:200]
+
+
+async def buffered(size: int):
+    body = b"".join([chunk async for chunk in body_chunks(size, as_json=True)])
+    text = json.loads(body)["text"]
+    return summarize_stub(text[:CHUNK_CHARS], "text-davinci-003")
+
+
+async def streamed(size: int):
+    document = await spool_stream(body_chunks(size), max_bytes=size * 2)
+    try:
+        return await summarize_document(document, "text-davinci-003", CHUNK_CHARS, concurrency=4)
+    finally:
+        document.close()
+
+
+CASES = {"buffered": buffered, "streamed": streamed}
+
+
+def rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+
+def measure(name: str, size: int):
+    baseline = rss()
+    started = time.perf_counter()
+    with patch("utils.documents.summarize_text", summarize_stub):
+        asyncio.run(CASES[name](size))
+    print(json.dumps({"peak": rss() - baseline, "time": time.perf_counter() - started}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="Document sizes in MiB")
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        measure(args.case, args.sizes[0] * 1024 * 1024)
+        return
+
+    print(f"{'size':>8} {'path':>10} {'peak RSS':>12} {'time':>8}")
+    for size_mib in args.sizes:
+        for name in CASES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--case", name, "--sizes", str(size_mib)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            print(f"{size_mib:>5} MiB {name:>10} {result['peak'] / 2**20:>8.1f} MiB {result['time']:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
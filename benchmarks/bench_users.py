@@ -0,0 +1,106 @@
+"""Benchmarks user listing, export and import on a SQLite database.
+
+Compares offset pagination (`get_all_users`) with keyset pagination
+(`get_users_after`) at increasing depths, and measures the time and peak Python
+memory of the streamed export against loading every row at once.
+
+Usage:
+    python benchmarks/bench_users.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_users.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+from sqlalchemy import select  # noqa: E402
+
+from api.database import (  # noqa: E402
+    SessionLocal,
+    User,
+    bulk_insert_users,
+    get_all_users,
+    get_engine,
+    get_users_after,
+    iter_user_batches,
+)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def load(db, rows: int, batch_size: int) -> float:
+    start = time.perf_counter()
+    for first in range(0, rows, batch_size):
+        batch = [{"username": f"user{i}", "password": "x"} for i in range(first, min(first + batch_size, rows))]
+        bulk_insert_users(db, batch)
+    db.commit()
+    return time.perf_counter() - start
+
+
+def export_streamed(db, batch_size: int) -> int:
+    size = 0
+    for batch in iter_user_batches(db, batch_size):
+        size += len("".join(json.dumps({"id": user_id, "username": username}) + "\n" for user_id, username in batch))
+    return size
+
+
+def export_buffered(db) -> int:
+    rows = db.execute(select(User.id, User.username).order_by(User.id)).all()
+    return len("".join(json.dumps({"id": user_id, "username": username}) + "\n" for user_id, username in rows))
+
+
+def measure_memory(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    db = SessionLocal(bind=get_engine())
+    print(f"Loaded {args.rows} users in {load(db, args.rows, args.batch_size):.2f}s (SQLite at {DB_PATH})")
+
+    print(f"\n{'depth':>10} {'offset ms':>10} {'keyset ms':>10}")
+    for fraction in (0, 0.1, 0.5, 0.9, 0.999):
+        depth = int(args.rows * fraction)
+        offset_page, offset_time = timed(get_all_users, db, depth, args.page_size)
+        last_id = depth if depth else None  # IDs are dense from 1, so the row at `depth` has id == depth
+        keyset_page, keyset_time = timed(get_users_after, db, last_id, args.page_size)
+        assert [u.id for u in offset_page] == [u.id for u in keyset_page]
+        print(f"{depth:>10} {offset_time * 1000:>10.2f} {keyset_time * 1000:>10.2f}")
+        db.expunge_all()
+
+    streamed_time, streamed_peak = measure_memory(export_streamed, db, 1000)
+    buffered_time, buffered_peak = measure_memory(export_buffered, db)
+    print(f"\n{'export':>10} {'seconds':>10} {'peak MiB':>10}")
+    print(f"{'streamed':>10} {streamed_time:>10.2f} {streamed_peak:>10.1f}")
+    print(f"{'buffered':>10} {buffered_time:>10.2f} {buffered_peak:>10.1f}")
+
+    db.close()
+    os.remove(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,30 @@
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from pydantic import BaseSettings, Field, validator
 from pathlib import Path
+import asyncio
 import os
+import signal
 import sys
+import threading
 
 # Import for logging
 import structlog
-from utils.logger import log, debug, info, warning, error, critical
+
+# Import for the shared Redis connection pool
+import redis
 
 # Import for OpenAI API interaction (using OpenAI v1.52.0)
 from openai import OpenAI as OpenAI_v1_52_0
 
 # Import for loading environment variables
-from dotenv import load_dotenv
+from dotenv import dotenv_values, load_dotenv
+
+# Variables set by the deployment itself, which always win over the .env file
+ENVIRONMENT_KEYS = frozenset(os.environ)
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Import for accessing configuration settings
-from config.config import settings
-
 class Settings(BaseSettings):
     OPENAI_API_KEY: str = Field(..., env="OPENAI_API_KEY")
     DATABASE_URL: Optional[str] = Field(None, env="DATABASE_URL")
@@ -29,6 +34,50 @@ class Settings(BaseSettings):
     REDIS_URL: Optional[str] = Field(None, env="REDIS_URL")
     PORT: int = Field(8000, env="PORT")
     API_BASE_URL: str = Field("http://localhost:8000", env="API_BASE_URL")  # Set the base URL for the API
+    AUTH_TOKEN: Optional[str] = Field(None, env="AUTH_TOKEN")
+    LOG_LEVEL: str = Field("INFO", env="LOG_LEVEL")
+    SETTINGS_WATCH_INTERVAL: float = Field(2.0, env="SETTINGS_WATCH_INTERVAL")  # Seconds between .env checks, 0 disables
+    COMPRESSION_LEVEL: int = Field(6, env="COMPRESSION_LEVEL")  # Default response compression level
+    COMPRESSION_MINIMUM_SIZE: int = Field(1024, env="COMPRESSION_MINIMUM_SIZE")  # Smaller responses are sent as is
+    MAX_DECOMPRESSED_REQUEST_SIZE: int = Field(32 * 1024 * 1024, env="MAX_DECOMPRESSED_REQUEST_SIZE")
+    TRANSLATE_BATCH_WINDOW: float = Field(0.02, env="TRANSLATE_BATCH_WINDOW")  # Longest wait for other /translate calls, in seconds
+    TRANSLATE_BATCH_MAX_SIZE: int = Field(16, env="TRANSLATE_BATCH_MAX_SIZE")
+    TRANSLATE_BATCH_TOKEN_BUDGET: int = Field(2000, env="TRANSLATE_BATCH_TOKEN_BUDGET")
+    TOKENIZER_ENCODING: str = Field("cl100k_base", env="TOKENIZER_ENCODING")
+    GENERATE_MAX_TOKENS: int = Field(1024, env="GENERATE_MAX_TOKENS")  # Completion budget of /generate_text
+    SUMMARY_MAX_TOKENS: int = Field(1024, env="SUMMARY_MAX_TOKENS")
+    SUMMARY_RATIO: float = Field(0.25, env="SUMMARY_RATIO")  # Summary budget relative to the input length
+    SESSION_STORE: str = Field("memory", env="SESSION_STORE")  # "memory" or "redis" for conversation sessions
+    SESSION_CONTEXT_TOKENS: int = Field(2048, env="SESSION_CONTEXT_TOKENS")  # Older turns are summarized beyond this
+    SESSION_KEEP_TURNS: int = Field(4, env="SESSION_KEEP_TURNS")
+    SESSION_MAX_BYTES: int = Field(64 * 1024 * 1024, env="SESSION_MAX_BYTES")
+    SESSION_IDLE_TTL: float = Field(1800.0, env="SESSION_IDLE_TTL")
+    SESSION_MAX_PENDING: int = Field(8, env="SESSION_MAX_PENDING")  # Messages of one WebSocket processed at once
+    ARCHIVE_DIR: Optional[str] = Field(None, env="ARCHIVE_DIR")  # Archive LLM route traffic here when set
+    ARCHIVE_SEGMENT_SIZE: int = Field(64 * 1024 * 1024, env="ARCHIVE_SEGMENT_SIZE")
+    ARCHIVE_QUEUE_SIZE: int = Field(10000, env="ARCHIVE_QUEUE_SIZE")
+    UPLOAD_MAX_BYTES: int = Field(100 * 1024 * 1024, env="UPLOAD_MAX_BYTES")  # Largest document accepted by the upload routes
+    UPLOAD_SPOOL_MEMORY: int = Field(1024 * 1024, env="UPLOAD_SPOOL_MEMORY")  # Larger uploads are spooled to disk
+    UPLOAD_CHUNK_CHARS: int = Field(8000, env="UPLOAD_CHUNK_CHARS")  # Upper bound of a document chunk sent upstream
+    UPLOAD_CONCURRENCY: int = Field(4, env="UPLOAD_CONCURRENCY")  # Chunks of one document processed at a time
+    EMBEDDING_BACKEND: str = Field("openai", env="EMBEDDING_BACKEND")  # "openai", or "local" for the offline hashing embedder
+    EMBEDDING_MODEL: str = Field("text-embedding-3-small", env="EMBEDDING_MODEL")
+    EMBED_BATCH_WINDOW: float = Field(0.01, env="EMBED_BATCH_WINDOW")  # Longest wait for other /embed and /search calls, in seconds
+    EMBED_BATCH_MAX_SIZE: int = Field(256, env="EMBED_BATCH_MAX_SIZE")
+    EMBED_BATCH_TOKEN_BUDGET: int = Field(100000, env="EMBED_BATCH_TOKEN_BUDGET")
+    VECTOR_STORE_DIR: str = Field("vector_store", env="VECTOR_STORE_DIR")
+    VECTOR_SEARCH_PARTITION_BYTES: int = Field(64 * 1024 * 1024, env="VECTOR_SEARCH_PARTITION_BYTES")  # Vectors scored at a time by /search
+    CACHE_BACKEND: str = Field("memory", env="CACHE_BACKEND")  # "memory" or "redis" for the /generate_text and /summarize cache
+    CACHE_TTL: float = Field(300.0, env="CACHE_TTL")  # Seconds a cached result is fresh, 0 disables the cache
+    CACHE_STALE_TTL: float = Field(60.0, env="CACHE_STALE_TTL")  # Seconds a stale result is served while it is refreshed
+    CACHE_REFRESH_AHEAD: float = Field(30.0, env="CACHE_REFRESH_AHEAD")  # Hot entries are refreshed this long before expiry
+    CACHE_REFRESH_BUDGET: float = Field(60.0, env="CACHE_REFRESH_BUDGET")  # Background refreshes per minute
+    CACHE_HOT_KEYS: int = Field(100, env="CACHE_HOT_KEYS")
+    CACHE_MAX_ENTRIES: int = Field(10000, env="CACHE_MAX_ENTRIES")
+    CACHE_SNAPSHOT_PATH: Optional[str] = Field(None, env="CACHE_SNAPSHOT_PATH")  # Hot requests, prompts included, pre-warmed at startup
+    ADMISSION_MAX_LAG: float = Field(0.25, env="ADMISSION_MAX_LAG")  # Event loop lag in seconds above which LLM routes are shed
+    ADMISSION_MAX_IN_FLIGHT: int = Field(64, env="ADMISSION_MAX_IN_FLIGHT")  # LLM requests in flight above which new ones are shed
+    ADMISSION_CRITICAL_LAG: float = Field(1.0, env="ADMISSION_CRITICAL_LAG")  # Event loop lag above which all routes are shed
 
     @validator("OPENAI_API_KEY")
     def validate_openai_api_key(cls, value):
@@ -42,14 +91,237 @@ class Settings(BaseSettings):
             raise ValueError("SECRET_KEY environment variable is not set.")
         return value
 
+    @validator("LOG_LEVEL")
+    def validate_log_level(cls, value):
+        value = value.upper()
+        if value not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+            raise ValueError("LOG_LEVEL must be one of DEBUG, INFO, WARNING, ERROR, CRITICAL.")
+        return value
+
     class Config:
         env_file = ".env"
 
-# Initialize the OpenAI client with the API key from settings
-openai = OpenAI_v1_52_0(api_key=settings.OPENAI_API_KEY)
-
 # Set up the logging system
 logger = structlog.get_logger()
 
+
+class SettingsProvider:
+    """Holds the single Settings instance of the process and swaps it on reload.
+
+    Readers always get a fully validated Settings object: a reload builds the new
+    instance first and replaces the reference in one assignment, so a request that
+    already holds the previous instance keeps using it until it finishes.
+    """
+
+    def __init__(
+        self,
+        env_file: str = ".env",
+        factory: Callable[[], Settings] = Settings,
+        environment_keys: Iterable[str] = ENVIRONMENT_KEYS,
+    ):
+        self.env_file = Path(env_file)
+        self._factory = factory
+        self._environment_keys = frozenset(environment_keys)
+        # Variables the .env file set, unset again when they are removed from it
+        self._file_keys = set(self._read_env_file()) - self._environment_keys
+        self._settings: Optional[Settings] = None
+        self._lock = threading.Lock()
+        self._listeners: List[Tuple[frozenset, Callable[[Settings, Settings], Any]]] = []
+        self._mtime = self._env_file_mtime()
+
+    def get(self) -> Settings:
+        """Returns the current settings, loading them on first use.
+
+        Returns:
+            Settings: The current settings.
+        """
+        settings = self._settings
+        if settings is None:
+            with self._lock:
+                if self._settings is None:
+                    self._settings = self._factory()
+                settings = self._settings
+        return settings
+
+    def subscribe(self, fields: Iterable[str], callback: Callable[[Settings, Settings], Any]):
+        """Registers a callback invoked after a reload changed any of the given fields.
+
+        Args:
+            fields (Iterable[str]): The settings fields the callback depends on.
+            callback (Callable[[Settings, Settings], Any]): Called with the old and the new settings.
+        """
+        self._listeners.append((frozenset(fields), callback))
+
+    def reload(self) -> bool:
+        """Re-reads the environment file and swaps in the new settings.
+
+        As on the initial load, variables set in the real environment win over the
+        file, and variables removed from the file are unset. Invalid settings are
+        logged and the current ones are kept.
+
+        Returns:
+            bool: True if any setting changed, False otherwise.
+        """
+        with self._lock:
+            self._mtime = self._env_file_mtime()
+            self._apply_env_file()
+            try:
+                new = self._factory()
+            except Exception as e:
+                logger.error(f"Error reloading settings, keeping current values: {e}")
+                return False
+            old = self._settings
+            self._settings = new
+
+        if old is None:
+            return True
+        changed = {name for name, value in new.dict().items() if getattr(old, name, None) != value}
+        if not changed:
+            return False
+        logger.info(f"Settings reloaded, changed: {', '.join(sorted(changed))}")
+        for fields, callback in self._listeners:
+            if fields & changed:
+                try:
+                    callback(old, new)
+                except Exception as e:
+                    logger.error(f"Error applying reloaded settings: {e}")
+        return True
+
+    def install_signal_handler(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Reloads the settings when the process receives SIGHUP.
+
+        Args:
+            loop (Optional[asyncio.AbstractEventLoop]): The running event loop, if any.
+        """
+        if not hasattr(signal, "SIGHUP"):
+            return
+        try:
+            if loop is not None:
+                loop.add_signal_handler(signal.SIGHUP, self.reload)
+            else:
+                signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+        except (RuntimeError, NotImplementedError, ValueError) as e:
+            # Signals can only be handled on the main thread, e.g. not under a test client
+            logger.warning(f"Not reloading settings on SIGHUP: {e}")
+
+    async def watch(self, interval: float):
+        """Polls the environment file and reloads the settings when it changes.
+
+        Args:
+            interval (float): Seconds between two checks.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if self._env_file_mtime() != self._mtime:
+                self.reload()
+
+    def _read_env_file(self) -> Dict[str, Optional[str]]:
+        try:
+            return dict(dotenv_values(self.env_file)) if self.env_file.exists() else {}
+        except OSError as e:
+            logger.error(f"Error reading {self.env_file}: {e}")
+            return {}
+
+    def _apply_env_file(self):
+        values = {key: value for key, value in self._read_env_file().items() if value is not None}
+        for key in self._file_keys - values.keys():
+            os.environ.pop(key, None)
+        self._file_keys = set(values) - self._environment_keys
+        for key in self._file_keys:
+            os.environ[key] = values[key]
+
+    def _env_file_mtime(self) -> Optional[int]:
+        try:
+            return self.env_file.stat().st_mtime_ns
+        except OSError:
+            return None
+
+
+class ReloadableResource:
+    """Lazily builds a resource from the settings and rebuilds it only when its inputs change.
+
+    The previous instance is handed to `dispose` after the new one is in place, so
+    callers that already hold it can finish their work.
+    """
+
+    def __init__(
+        self,
+        fields: Tuple[str, ...],
+        factory: Callable[[Settings], Any],
+        dispose: Optional[Callable[[Any], Any]] = None,
+        provider: Optional[SettingsProvider] = None,
+    ):
+        self.fields = fields
+        self._factory = factory
+        self._dispose = dispose
+        self._provider = provider
+        self._key: Optional[Tuple[Any, ...]] = None
+        self._resource: Any = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """Returns the resource built from the current settings.
+
+        Returns:
+            Any: The resource.
+        """
+        settings = (self._provider or settings_provider).get()
+        key = tuple(getattr(settings, field) for field in self.fields)
+        if key == self._key:
+            return self._resource
+        with self._lock:
+            if key != self._key:
+                old, had_old = self._resource, self._key is not None
+                self._resource = self._factory(settings)
+                self._key = key
+                if had_old and self._dispose is not None:
+                    try:
+                        self._dispose(old)
+                    except Exception as e:
+                        logger.error(f"Error disposing resource: {e}")
+            return self._resource
+
+
 # Configure the application settings
-settings = Settings()
\ No newline at end of file
+settings_provider = SettingsProvider()
+
+
+def get_settings() -> Settings:
+    """Returns the settings of the process, loaded once and swapped on reload.
+
+    Returns:
+        Settings: The current settings.
+    """
+    return settings_provider.get()
+
+
+def _create_redis_pool(settings: Settings) -> Optional[redis.ConnectionPool]:
+    return redis.ConnectionPool.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
+
+
+# Initialize the OpenAI client with the API key from settings, rebuilt when the key changes
+_openai_client = ReloadableResource(("OPENAI_API_KEY",), lambda s: OpenAI_v1_52_0(api_key=s.OPENAI_API_KEY))
+_redis_pool = ReloadableResource(
+    ("REDIS_URL",),
+    _create_redis_pool,
+    dispose=lambda pool: pool.disconnect(inuse_connections=False) if pool is not None else None,
+)
+
+
+def get_openai_client() -> OpenAI_v1_52_0:
+    """Returns the OpenAI client built from the current settings.
+
+    Returns:
+        OpenAI_v1_52_0: The OpenAI client.
+    """
+    return _openai_client.get()
+
+
+def get_redis_client() -> Optional[redis.Redis]:
+    """Returns a Redis client on the shared connection pool, or None if REDIS_URL is not set.
+
+    Returns:
+        Optional[redis.Redis]: The Redis client.
+    """
+    pool = _redis_pool.get()
+    return redis.Redis(connection_pool=pool) if pool is not None else None
@@ -0,0 +1,97 @@
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from api.admission import AdmissionMiddleware
+from utils.load_monitor import LoadMonitor
+
+def make_client(monitor):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware)
+    app.state.load_monitor = monitor
+
+    @app.post("/generate_text")
+    async def generate():
+        return {"in_flight": monitor.heavy_in_flight}
+
+    @app.get("/users/{user_id}")
+    async def user(user_id: int):
+        return {"id": user_id}
+
+    @app.websocket("/ws/conversations")
+    async def conversations(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_json({"in_flight": monitor.heavy_in_flight})
+        await websocket.receive_text()
+
+    @app.get("/health")
+    async def health():
+        return monitor.status()
+
+    return TestClient(app)
+
+# Test case for admitting and counting requests under normal load
+def test_requests_admitted():
+    monitor = LoadMonitor()
+    client = make_client(monitor)
+    assert client.post("/generate_text").json() == {"in_flight": 1}
+    assert monitor.in_flight == 0 and monitor.rejected == 0
+
+# Test case for shedding LLM routes first when the loop lags
+def test_heavy_routes_shed_first():
+    monitor = LoadMonitor(max_lag=0.1, critical_lag=1.0)
+    client = make_client(monitor)
+    monitor.record_lag(0.5)
+    response = client.post("/generate_text")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
+    assert client.get("/users/1").status_code == 200
+
+    monitor.record_lag(2.0)
+    assert client.get("/users/1").status_code == 503
+    assert client.get("/health").json()["status"] == "overloaded"
+    assert monitor.rejected == 2
+
+# Test case for shedding LLM routes when too many are in flight
+def test_in_flight_limit():
+    monitor = LoadMonitor(max_in_flight=1)
+    client = make_client(monitor)
+    with monitor.track(heavy=True):
+        assert client.post("/generate_text").status_code == 503
+    assert client.post("/generate_text").status_code == 200
+
+# Test case for idle WebSockets not holding in-flight slots
+def test_websockets_not_counted_in_flight():
+    monitor = LoadMonitor(max_in_flight=2)
+    client = make_client(monitor)
+    with client.websocket_connect("/ws/conversations") as first, client.websocket_connect("/ws/conversations") as second:
+        assert first.receive_json() == second.receive_json() == {"in_flight": 0}
+        assert client.post("/generate_text").status_code == 200
+        assert client.get("/health").json()["status"] == "ok"
+        first.send_text("bye")
+        second.send_text("bye")
+
+    # Still shed at the handshake when overloaded
+    monitor.record_lag(0.5)
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect("/ws/conversations"):
+            pass
+    assert error.value.code == 1013
+
+# Test case for measuring the lag of a blocked event loop
+def test_monitor_measures_lag():
+    monitor = LoadMonitor(interval=0.01)
+
+    async def run():
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.02)
+        time.sleep(0.2)  # Blocks the loop
+        await asyncio.sleep(0.02)
+        task.cancel()
+
+    asyncio.run(run())
+    assert monitor.lag > 0.1
+    monitor.record_lag(0.0)
+    assert 0 < monitor.lag < 0.2
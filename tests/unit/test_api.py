@@ -8,7 +8,7 @@ from unittest.mock import patch, Mock
 # Mock OpenAI client with version 1.52.0
 @pytest.fixture
 def mock_openai():
-    with patch("api.api.OpenAI") as mock_client:
+    with patch("api.api.get_openai_client") as mock_client:
         mock_client.return_value = Mock()
         yield mock_client
 
@@ -0,0 +1,84 @@
+import asyncio
+import gzip
+from unittest.mock import AsyncMock, Mock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api.archive import ArchiveMiddleware
+from utils.archive import ArchiveReader, ArchiveWriter
+from utils.replay import replay_records
+
+def write_records(directory, timestamps, **kwargs):
+    async def run():
+        writer = ArchiveWriter(str(directory), **kwargs)
+        writer.start()
+        for ts in timestamps:
+            writer.record({"ts": ts, "path": "/summarize", "request": {"text": f"text {ts}"}})
+        await writer.close()
+        return writer
+
+    return asyncio.run(run())
+
+# Test case for reading back a time range through the index
+def test_time_range_is_located_by_index(tmp_path):
+    write_records(tmp_path, [1000.0 + i for i in range(200)], block_size=512, segment_size=1024)
+    reader = ArchiveReader(str(tmp_path))
+    assert len(reader.segments()) > 1
+
+    records = list(reader.iter_records(1050.0, 1059.0))
+    assert [record["ts"] for record in records] == [1050.0 + i for i in range(10)]
+    assert records[0]["request"] == {"text": "text 1050.0"}
+
+    # Only a few blocks need to be read for a narrow range
+    total_blocks = sum(len(reader.blocks(segment)) for segment in reader.segments())
+    read_blocks = sum(len(reader.blocks(segment, 1050.0, 1059.0)) for segment in reader.segments())
+    assert read_blocks < total_blocks // 4
+
+# Test case for out-of-order records of concurrent requests
+def test_unordered_records_are_found(tmp_path):
+    write_records(tmp_path, [5.0, 1.0, 4.0, 2.0, 3.0, 9.0, 6.0, 8.0, 7.0], block_size=64)
+    assert sorted(r["ts"] for r in ArchiveReader(str(tmp_path)).iter_records(2.0, 6.0)) == [2.0, 3.0, 4.0, 5.0, 6.0]
+
+# Test case for segments being plain gzip files
+def test_segments_are_gzip(tmp_path):
+    write_records(tmp_path, [1.0, 2.0, 3.0], block_size=64)
+    segment = ArchiveReader(str(tmp_path)).segments()[0]
+    assert gzip.decompress(segment.read_bytes()).count(b"\n") == 3
+
+# Test case for bounded buffering
+def test_full_buffer_drops_records(tmp_path):
+    writer = ArchiveWriter(str(tmp_path), queue_size=2)
+    for ts in range(5):
+        writer.record({"ts": float(ts)})
+    assert writer.dropped == 3
+
+# Test case for archiving the request, response and default model of a route
+def test_middleware_records_default_model():
+    app = FastAPI()
+    app.add_middleware(ArchiveMiddleware)
+    app.state.archive_writer = Mock()
+
+    @app.post("/summarize")
+    async def summarize(body: dict):
+        return {"summary": body["text"].upper()}
+
+    assert TestClient(app).post("/summarize", json={"text": "abc"}).status_code == 200
+    record = app.state.archive_writer.record.call_args[0][0]
+    assert record["model"] == "text-davinci-003"
+    assert (record["request"], record["response"], record["status"]) == ({"text": "abc"}, {"summary": "ABC"}, 200)
+    assert record["truncated"] is False
+
+# Test case for replaying archived records, skipping truncated ones
+def test_replay_skips_truncated(tmp_path):
+    async def run():
+        writer = ArchiveWriter(str(tmp_path))
+        writer.start()
+        writer.record({"ts": 1.0, "method": "POST", "path": "/summarize", "request": {"text": "a"}, "truncated": False})
+        writer.record({"ts": 2.0, "method": "POST", "path": "/summarize", "request": "{\"text\": \"b", "truncated": True})
+        await writer.close()
+        with patch("utils.replay.send", new=AsyncMock()) as send:
+            results = await replay_records(str(tmp_path), "http://test", None, None, 0, 4)
+        return send, results
+
+    send, results = asyncio.run(run())
+    assert [call.args[2]["ts"] for call in send.call_args_list] == [1.0]
+    assert results["skipped"] == [2.0]
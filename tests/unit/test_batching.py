@@ -0,0 +1,67 @@
+import asyncio
+from unittest.mock import AsyncMock
+from utils.batching import MicroBatcher
+
+def make_batcher(batch_results=None, **kwargs):
+    async def batch_fn(key, items):
+        if batch_results is not None:
+            return batch_results
+        return [f"{key}:{item}!" for item in items]
+
+    async def single_fn(key, item):
+        return f"{key}:{item}"
+
+    batch_fn = AsyncMock(side_effect=batch_fn)
+    single_fn = AsyncMock(side_effect=single_fn)
+    kwargs.setdefault("cost_fn", len)
+    return MicroBatcher(batch_fn, single_fn, **kwargs), batch_fn, single_fn
+
+async def _burst(batcher, items, key="en-fr"):
+    # Warm up the arrival rate so the batcher expects more requests
+    batcher._record_arrival(key, asyncio.get_running_loop().time())
+    return await asyncio.gather(*(batcher.submit(key, item) for item in items))
+
+# Test case for dispatching immediately at low load
+def test_single_request_is_not_delayed():
+    batcher, batch_fn, single_fn = make_batcher(max_window=10.0)
+    assert asyncio.run(asyncio.wait_for(batcher.submit("en-fr", "a"), 1.0)) == "en-fr:a"
+    batch_fn.assert_not_called()
+
+# Test case for coalescing concurrent requests of the same key
+def test_concurrent_requests_share_one_call():
+    batcher, batch_fn, single_fn = make_batcher(max_window=0.05)
+    assert asyncio.run(_burst(batcher, ["a", "b", "c"])) == ["en-fr:a!", "en-fr:b!", "en-fr:c!"]
+    batch_fn.assert_called_once_with("en-fr", ["a", "b", "c"])
+
+# Test case for splitting batches on size and token budget
+def test_batches_respect_limits():
+    batcher, batch_fn, _ = make_batcher(max_window=0.05, max_batch_size=2)
+    asyncio.run(_burst(batcher, ["a", "b", "c", "d"]))
+    assert [call.args[1] for call in batch_fn.call_args_list] == [["a", "b"], ["c", "d"]]
+
+    batcher, batch_fn, single_fn = make_batcher(max_window=0.05, token_budget=10, cost_fn=len)
+    asyncio.run(_burst(batcher, ["aaaa", "bbbb", "cccc"]))
+    batch_fn.assert_called_once_with("en-fr", ["aaaa", "bbbb"])
+    single_fn.assert_called_once_with("en-fr", "cccc")
+
+# Test case for falling back to one call per item when the batch fails
+def test_fallback_to_single_calls():
+    batcher, batch_fn, single_fn = make_batcher(batch_results=["only one"], max_window=0.05)
+    assert asyncio.run(_burst(batcher, ["a", "b"])) == ["en-fr:a", "en-fr:b"]
+    assert single_fn.call_count == 2
+
+# Test case for batching the items of one request together
+def test_submit_many():
+    batcher, batch_fn, single_fn = make_batcher(max_window=10.0, max_batch_size=2)
+    results = asyncio.run(asyncio.wait_for(batcher.submit_many("en-fr", ["a", "b", "c"]), 1.0))
+    assert results == ["en-fr:a!", "en-fr:b!", "en-fr:c"]
+    batch_fn.assert_called_once_with("en-fr", ["a", "b"])
+    single_fn.assert_called_once_with("en-fr", "c")
+
+# Test case for sizing the window from the arrival rate
+def test_window_follows_arrival_rate():
+    batcher, _, _ = make_batcher(max_window=0.05)
+    assert batcher._record_arrival("en-fr", 0.0) == 0.0
+    assert abs(batcher._record_arrival("en-fr", 0.01) - 0.02) < 1e-9
+    assert abs(batcher._record_arrival("en-fr", 0.01) - 0.016) < 1e-9  # Faster arrivals, shorter window
+    assert batcher._record_arrival("en-fr", 1.0) == 0.0  # Slower than the largest window
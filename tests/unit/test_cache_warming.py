@@ -0,0 +1,122 @@
+import asyncio
+import random
+import time
+from unittest.mock import Mock, patch
+from utils.cache_warming import CacheWarmer, CountMinSketch, MemoryCache, PopularityTracker, TopK
+from utils.helpers import get_cache_data, set_cache_data
+
+def make_warmer(**kwargs):
+    summarize = Mock(side_effect=lambda text, model: f"summary of {text}")
+    cache = MemoryCache()
+    warmer = CacheWarmer(lambda: cache, **kwargs)
+    warmer.register("summarize", summarize)
+    return warmer, summarize
+
+async def _settle(warmer):
+    await asyncio.gather(*warmer._tasks)
+
+# Test case for finding the heavy hitters among many rare keys
+def test_tracker_finds_hot_keys():
+    rng = random.Random(0)
+    tracker = PopularityTracker(k=3, width=256)
+    accesses = [f"hot{i}" for i in range(3) for _ in range(200)] + [f"cold{i}" for i in range(2000)]
+    rng.shuffle(accesses)
+    for key in accesses:
+        tracker.record(key)
+    assert {key for key, _ in tracker.hot_keys()} == {"hot0", "hot1", "hot2"}
+
+    sketch = CountMinSketch(width=64)
+    for key in accesses:
+        sketch.add(key)
+    assert sketch.estimate("hot0") >= 200
+
+# Test case for evicting the least popular key and decaying counts
+def test_top_k_evicts_and_decays():
+    top = TopK(k=2)
+    assert top.offer("a", 5) is None and top.offer("b", 3) is None
+    assert top.offer("c", 2) is None and "c" not in top
+    assert top.offer("c", 4) == "b"
+    top.decay()
+    assert top.items() == [("a", 2), ("c", 2)]
+
+# Test case for sharing one upstream call between concurrent misses, then hitting the cache
+def test_cache_single_flight():
+    warmer, summarize = make_warmer()
+
+    async def run():
+        results = await asyncio.gather(*(warmer.get("summarize", {"text": "x", "model": "m"}) for _ in range(5)))
+        results.append(await warmer.get("summarize", {"text": "x", "model": "m"}))
+        return results
+
+    assert asyncio.run(run()) == ["summary of x"] * 6
+    summarize.assert_called_once_with(text="x", model="m")
+
+# Test case for serving stale entries while refreshing them, and refreshing hot entries ahead of expiry
+def test_stale_while_revalidate():
+    warmer, summarize = make_warmer(ttl=60, refresh_ahead=10)
+    key = warmer.key_for("summarize", {"text": "x", "model": "m"})
+    set_cache_data(key, {"value": "old", "expires": time.time() - 1}, warmer.cache)
+
+    async def run():
+        assert await warmer.get("summarize", {"text": "x", "model": "m"}) == "old"
+        await _settle(warmer)
+        assert await warmer.get("summarize", {"text": "x", "model": "m"}) == "summary of x"
+
+        # About to expire and hot: refreshed by the background round
+        set_cache_data(key, {"value": "old", "expires": time.time() + 5}, warmer.cache)
+        assert await warmer.refresh_hot() == 1
+        await _settle(warmer)
+
+    asyncio.run(run())
+    assert summarize.call_count == 2
+    assert get_cache_data(key, warmer.cache)["value"] == "summary of x"
+
+# Test case for limiting background refreshes to the budget
+def test_refresh_budget():
+    warmer, summarize = make_warmer(refresh_budget=6)  # Bursts of one refresh
+
+    async def run():
+        for text in ("a", "b", "c"):
+            warmer._track(warmer.key_for("summarize", {"text": text, "model": "m"}), "summarize", {"text": text, "model": "m"})
+        assert await warmer.refresh_hot() == 1
+        await _settle(warmer)
+
+    asyncio.run(run())
+    assert summarize.call_count == 1
+
+# Test case for pre-warming a new cache from the snapshot of the hot requests
+def test_prewarm_from_snapshot(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    warmer, _ = make_warmer(snapshot_path=path)
+
+    async def run():
+        for _ in range(3):
+            await warmer.get("summarize", {"text": "popular", "model": "m"})
+        await warmer.close()
+
+        fresh, summarize = make_warmer(snapshot_path=path)
+        assert await fresh.prewarm() == 1
+        await _settle(fresh)
+        with patch.object(fresh, "_compute", side_effect=AssertionError("not cached")):
+            assert await fresh.get("summarize", {"text": "popular", "model": "m"}) == "summary of popular"
+        return fresh
+
+    fresh = asyncio.run(run())
+    assert fresh.tracker.hot_keys()[0][1] >= 3
+
+# Test case for keeping entries with a TTL under one second, which Redis rejects as 0
+def test_short_ttl_rounds_up():
+    cache = Mock(get=Mock(return_value=None))
+    warmer = CacheWarmer(lambda: cache, ttl=0.4, stale_ttl=0.2)
+    warmer.register("summarize", Mock(return_value="summary"))
+    asyncio.run(warmer.get("summarize", {"text": "x", "model": "m"}))
+    assert cache.set.call_args.kwargs["ex"] == 1
+
+# Test case for answering from the upstream when the cache is unavailable
+def test_cache_errors_fall_back_to_upstream():
+    cache = Mock(get=Mock(side_effect=ConnectionError("Redis is down")), set=Mock(side_effect=ConnectionError("Redis is down")))
+    warmer = CacheWarmer(lambda: cache)
+    summarize = Mock(return_value="summary")
+    warmer.register("summarize", summarize)
+    assert asyncio.run(warmer.get("summarize", {"text": "x", "model": "m"})) == "summary"
+    summarize.assert_called_once_with(text="x", model="m")
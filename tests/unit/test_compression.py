@@ -0,0 +1,100 @@
+import asyncio
+import gzip
+import pytest
+import zlib
+import zstandard
+from types import SimpleNamespace
+from unittest.mock import patch
+from api.compression import CompressionMiddleware, CompressionPolicy, negotiate_encoding
+
+@pytest.fixture(autouse=True)
+def settings():
+    values = SimpleNamespace(COMPRESSION_LEVEL=6, COMPRESSION_MINIMUM_SIZE=100, MAX_DECOMPRESSED_REQUEST_SIZE=1000)
+    with patch("api.compression.get_settings", return_value=values):
+        yield values
+
+# Minimal ASGI app sending the given chunks and echoing the request body into `received`
+def make_app(chunks, content_type=b"application/json", received=None):
+    async def app(scope, receive, send):
+        if received is not None:
+            more_body = True
+            while more_body:
+                message = await receive()
+                received.append(message["body"])
+                more_body = message.get("more_body", False)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+
+    return app
+
+def call(app, headers, body=b"", path="/summarize"):
+    sent = []
+    request = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return request.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": path, "headers": headers}
+    asyncio.run(app(scope, receive, send))
+    return dict(sent[0]["headers"]) if sent[0].get("headers") else {}, sent
+
+# Test case for content negotiation
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br, zstd") == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, zstd;q=0.5") == "gzip"
+    assert negotiate_encoding("zstd;q=0, gzip") == "gzip"
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("") is None
+
+# Test case for compressing a complete response above the threshold
+def test_compresses_large_response():
+    body = b'{"summary": "' + b"lorem ipsum " * 100 + b'"}'
+    headers, sent = call(CompressionMiddleware(make_app([body])), [(b"accept-encoding", b"gzip")])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"content-length"] == str(len(sent[1]["body"])).encode()
+    assert gzip.decompress(sent[1]["body"]) == body
+
+# Test case for leaving small responses and per-route thresholds alone
+def test_small_response_passthrough():
+    middleware = CompressionMiddleware(make_app([b'{"text": "hi"}']))
+    headers, sent = call(middleware, [(b"accept-encoding", b"gzip")])
+    assert b"content-encoding" not in headers
+    assert sent[1]["body"] == b'{"text": "hi"}'
+
+    middleware = CompressionMiddleware(make_app([b'{"text": "hi"}']), routes={"/users": CompressionPolicy(minimum_size=0)})
+    headers, _ = call(middleware, [(b"accept-encoding", b"gzip")], path="/users/export")
+    assert headers[b"content-encoding"] == b"gzip"
+
+# Test case for flushing every NDJSON chunk so clients can decode it immediately
+def test_streaming_chunks_are_flushed():
+    chunks = [b'{"id": 1}\n', b'{"id": 2}\n', b""]
+    app = CompressionMiddleware(make_app(chunks, content_type=b"application/x-ndjson"))
+    headers, sent = call(app, [(b"accept-encoding", b"zstd")])
+    assert headers[b"content-encoding"] == b"zstd"
+    assert b"content-length" not in headers
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    assert decompressor.decompress(sent[1]["body"]) == chunks[0]
+    assert decompressor.decompress(sent[2]["body"]) == chunks[1]
+
+# Test case for flushing chunks of any streamed content type, e.g. a plain-text translation
+def test_plain_text_chunks_are_flushed():
+    chunks = [b"Bonjour. ", b"Comment allez-vous ? ", b"Au revoir.", b""]
+    app = CompressionMiddleware(make_app(chunks, content_type=b"text/plain; charset=utf-8"))
+    headers, sent = call(app, [(b"accept-encoding", b"gzip")])
+    assert headers[b"content-encoding"] == b"gzip"
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    assert [decompressor.decompress(message["body"]) for message in sent[1:4]] == chunks[:3]
+
+# Test case for decompressing gzip request bodies and bounding their size
+def test_gzip_request_body(settings):
+    received = []
+    app = CompressionMiddleware(make_app([b"{}"], received=received))
+    call(app, [(b"content-encoding", b"gzip")], body=gzip.compress(b"x" * 500))
+    assert received == [b"x" * 500]
+
+    _, sent = call(CompressionMiddleware(make_app([b"{}"], received=[])), [(b"content-encoding", b"gzip")], body=gzip.compress(b"x" * 5000))
+    assert sent[0]["status"] == 413
@@ -0,0 +1,81 @@
+import os
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from config.config import SettingsProvider, ReloadableResource
+
+# Settings factory returning whatever the test put in `values`
+@pytest.fixture
+def values():
+    return {"OPENAI_API_KEY": "key-1", "DATABASE_URL": "sqlite://", "LOG_LEVEL": "INFO"}
+
+@pytest.fixture
+def provider(values, tmp_path):
+    def factory():
+        return SimpleNamespace(dict=lambda: dict(values), **values)
+
+    return SettingsProvider(env_file=str(tmp_path / ".env"), factory=factory)
+
+# Test case for loading the settings once per process
+def test_settings_are_memoized(provider):
+    assert provider.get() is provider.get()
+
+# Test case for swapping the settings and notifying only the affected listeners
+def test_reload_swaps_settings_and_notifies_listeners(provider, values):
+    first = provider.get()
+    log_listener, db_listener = Mock(), Mock()
+    provider.subscribe(("LOG_LEVEL",), log_listener)
+    provider.subscribe(("DATABASE_URL",), db_listener)
+
+    values["LOG_LEVEL"] = "DEBUG"
+    assert provider.reload() is True
+    assert provider.get() is not first
+    assert provider.get().LOG_LEVEL == "DEBUG"
+    log_listener.assert_called_once_with(first, provider.get())
+    db_listener.assert_not_called()
+
+    assert provider.reload() is False
+
+# Test case for keeping the current settings when the new ones are invalid
+def test_reload_keeps_settings_on_error(provider):
+    current = provider.get()
+    provider._factory = Mock(side_effect=ValueError("SECRET_KEY environment variable is not set."))
+    assert provider.reload() is False
+    assert provider.get() is current
+
+# Test case for rebuilding a resource only when its inputs change
+def test_resource_rebuilt_only_when_inputs_change(provider, values):
+    dispose = Mock()
+    resource = ReloadableResource(("OPENAI_API_KEY",), lambda s: object(), dispose=dispose, provider=provider)
+    client = resource.get()
+
+    values["LOG_LEVEL"] = "DEBUG"
+    provider.reload()
+    assert resource.get() is client
+
+    values["OPENAI_API_KEY"] = "key-2"
+    provider.reload()
+    assert resource.get() is not client
+    dispose.assert_called_once_with(client)
+
+# Test case for reloading the .env file without overriding the real environment
+def test_reload_keeps_real_environment(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("SECRET_KEY=placeholder\nTEST_FROM_FILE=1\n")
+    monkeypatch.setenv("SECRET_KEY", "real-secret")
+    monkeypatch.setenv("TEST_FROM_FILE", "1")
+    provider = SettingsProvider(env_file=str(env_file), factory=Mock(), environment_keys={"SECRET_KEY"})
+
+    env_file.write_text("SECRET_KEY=placeholder\nLOG_LEVEL_FROM_FILE=DEBUG\n")
+    monkeypatch.delenv("LOG_LEVEL_FROM_FILE", raising=False)
+    provider.reload()
+    assert os.environ["SECRET_KEY"] == "real-secret"
+    assert os.environ["LOG_LEVEL_FROM_FILE"] == "DEBUG"
+    assert "TEST_FROM_FILE" not in os.environ
+    monkeypatch.delenv("LOG_LEVEL_FROM_FILE")
+
+# Test case for skipping the SIGHUP handler off the main thread
+def test_signal_handler_off_main_thread(provider):
+    loop = Mock()
+    loop.add_signal_handler.side_effect = RuntimeError("set_wakeup_fd only works in main thread")
+    provider.install_signal_handler(loop)
@@ -0,0 +1,59 @@
+import asyncio
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from api.conversations import serve_conversations
+from utils.load_monitor import LoadMonitor
+from utils.sessions import Conversation
+
+class SlowManager:
+    """Conversation manager whose replies take long, so messages stay in flight."""
+
+    def __init__(self):
+        self.replies = 0
+
+    async def open(self, session_id=None):
+        return Conversation("session")
+
+    async def reply(self, session_id, text, model):
+        self.replies += 1
+        yield "Hello"
+        await asyncio.sleep(10)
+
+def make_client(manager, **kwargs):
+    app = FastAPI()
+
+    @app.websocket("/ws/conversations")
+    async def conversations(websocket: WebSocket):
+        await serve_conversations(websocket, manager, **kwargs)
+
+    return TestClient(app)
+
+# Test case for rejecting messages beyond the socket's limit of messages in flight
+def test_pending_messages_are_capped():
+    manager = SlowManager()
+    with make_client(manager, max_pending=2).websocket_connect("/ws/conversations") as websocket:
+        assert websocket.receive_json()["type"] == "session"
+        for request_id in (1, 2):
+            websocket.send_json({"id": request_id, "text": "Hi"})
+            assert websocket.receive_json()["type"] == "delta"
+        websocket.send_json({"id": 3, "text": "Hi"})
+        error = websocket.receive_json()
+        assert (error["type"], error["id"]) == ("error", 3)
+        assert "at most 2" in error["detail"]
+    assert manager.replies == 2
+
+# Test case for admitting and counting every message like an LLM request
+def test_messages_go_through_admission():
+    manager, monitor = SlowManager(), LoadMonitor(max_in_flight=1)
+    with make_client(manager, monitor=monitor).websocket_connect("/ws/conversations") as websocket:
+        assert websocket.receive_json()["type"] == "session"
+        websocket.send_json({"id": 1, "text": "Hi"})
+        assert websocket.receive_json()["type"] == "delta"
+        assert monitor.heavy_in_flight == 1
+
+        websocket.send_json({"id": 2, "text": "Hi"})
+        error = websocket.receive_json()
+        assert (error["type"], error["id"], error["retry_after"]) == ("error", 2, 1)
+        assert "overloaded" in error["detail"]
+    assert manager.replies == 1
+    assert (monitor.heavy_in_flight, monitor.rejected) == (0, 1)
@@ -0,0 +1,97 @@
+import asyncio
+import io
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException, Request
+from utils import documents
+from utils.documents import iter_sentence_chunks, map_ordered, spool_stream, spool_upload, summarize_document, translate_document
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+# Test case for splitting on sentence boundaries without losing text
+def test_chunks_end_on_sentences():
+    text = "First sentence here. Second one! Third? " * 20
+    chunks = list(iter_sentence_chunks(io.BytesIO(text.encode()), 100))
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.endswith((". ", "! ", "? ")) for chunk in chunks[:-1])
+
+# Test case for multi-byte characters split across reads and overlong sentences
+def test_chunks_decode_incrementally():
+    text = "é" * 10 + " " + "x" * 250
+    with patch.object(documents, "READ_SIZE", 3):
+        chunks = list(iter_sentence_chunks(io.BytesIO(text.encode()), 100))
+    assert "".join(chunks) == text
+    assert chunks[0] == "é" * 10 + " "
+    assert max(len(chunk) for chunk in chunks) == 100
+
+# Test case for bounded concurrency keeping the order of the results
+def test_map_ordered():
+    running, peak = 0, 0
+
+    async def work(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (5 - item))
+        running -= 1
+        return item * 2
+
+    async def run():
+        return [result async for result in map_ordered(_aiter(range(5)), work, 2)]
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert peak == 2
+
+# Test case for summarizing the chunk summaries until they fit in one chunk
+def test_summarize_document_reduces():
+    text = "A sentence of text. " * 50
+    with patch("utils.documents.summarize_text", side_effect=lambda text, model: f"summary of {len(text)}") as summarize:
+        summary = asyncio.run(summarize_document(io.BytesIO(text.encode()), "text-davinci-003", 100, 4))
+    assert summarize.call_count > 10
+    assert summary.startswith("summary of")
+    assert summarize.call_args[0][0].count("summary of") > 1
+
+# Test case for combining summaries too long to share a chunk
+def test_summarize_document_long_summaries_terminate():
+    text = "A sentence of text. " * 50
+    with patch("utils.documents.summarize_text", side_effect=lambda text, model: "s" * 60):
+        summary = asyncio.run(summarize_document(io.BytesIO(text.encode()), "text-davinci-003", 100, 4))
+    assert summary == "s" * 60
+
+# Test case for streaming translations chunk by chunk, keeping the separators
+def test_translate_document():
+    text = "One. Two.\n\nThree."
+    with patch("utils.documents.translate_text", side_effect=lambda text, src, tgt: text.strip().upper()):
+        async def run():
+            return [part async for part in translate_document(io.BytesIO(text.encode()), "en", "fr", 8, 2)]
+        parts = asyncio.run(run())
+    assert "".join(parts) == text.upper()
+    assert len(parts) > 1
+
+# Test case for rejecting documents over the size limit
+def test_spool_stream_limit():
+    document = asyncio.run(spool_stream(_aiter([b"abc", b"def"]), 10, max_memory=4))
+    assert document.read() == b"abcdef"
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(spool_stream(_aiter([b"abcdef", b"ghijkl"]), 10))
+    assert error.value.status_code == 413
+
+# Test case for rejecting an oversized multipart upload before it is fully received
+def test_spool_upload_multipart_limit():
+    received = 0
+
+    async def receive():
+        nonlocal received
+        received += 1
+        head = b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.txt"\r\n\r\n' if received == 1 else b""
+        return {"type": "http.request", "body": head + b"x" * 65536, "more_body": received < 100}
+
+    headers = [(b"content-type", b"multipart/form-data; boundary=b")]
+    request = Request({"type": "http", "method": "POST", "headers": headers}, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(spool_upload(request, 64 * 1024))
+    assert error.value.status_code == 413
+    assert received < 100
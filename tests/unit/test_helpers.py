@@ -0,0 +1,30 @@
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+from utils.helpers import iter_ndjson, translate_text
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+async def _collect(chunks):
+    return [record async for record in iter_ndjson(chunks)]
+
+# Test case for records split across chunk boundaries
+def test_iter_ndjson_reassembles_split_lines():
+    chunks = _chunks(b'{"username": "a"}\n{"user', b'name": "b"}\n\n', b'{"username": "c"}')
+    assert asyncio.run(_collect(chunks)) == [{"username": "a"}, {"username": "b"}, {"username": "c"}]
+
+# Test case for reporting the line of an invalid record
+def test_iter_ndjson_invalid_line():
+    with pytest.raises(ValueError) as e:
+        asyncio.run(_collect(_chunks(b'{"username": "a"}\nnot json\n')))
+    assert "line 2" in str(e.value)
+
+# Test case for translating a single text through the chat completions API
+def test_translate_text_uses_chat():
+    client = Mock()
+    client.chat.completions.create.return_value.choices = [Mock(message=Mock(content='["Bonjour"]'))]
+    with patch("utils.helpers.get_openai_client", return_value=client), patch("utils.helpers.plan_completion", return_value=Mock(max_tokens=64)):
+        assert translate_text("Hello", "en", "fr") == "Bonjour"
+    assert '["Hello"]' in client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
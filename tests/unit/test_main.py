@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import pytest
+from fastapi.testclient import TestClient
+
+# Settings the application needs at startup, replacing the placeholders of the .env file
+os.environ.update(
+    OPENAI_API_KEY="test-key",
+    SECRET_KEY="test-secret",
+    DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}",
+)
+os.environ.pop("REDIS_URL", None)
+
+from api.auth import generate_jwt_token
+from api.database import SessionLocal, User, get_engine
+from api.main import app
+from utils.helpers import hash_password
+
+@pytest.fixture
+def client():
+    # Entering the client runs the startup and shutdown handlers, off the main thread
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def auth_headers():
+    db = SessionLocal(bind=get_engine())
+    try:
+        if db.query(User).filter(User.username == "admin").first() is None:
+            db.add(User(username="admin", password=hash_password("admin-password")))
+            db.commit()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {generate_jwt_token('admin')}"}
+
+# Test case for starting the application and reporting its admission state
+def test_startup_and_health(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    assert app.state.response_cache is not None and app.state.conversations is not None
+
+# Test case for requiring a token for the user listing, export and import
+def test_user_routes_require_authentication(client):
+    assert client.get("/users").status_code == 401
+    assert client.get("/users/export").status_code == 401
+    assert client.post("/users/import", content=b"").status_code == 401
+
+# Test case for hashing imported passwords and keeping them out of error responses
+def test_import_hashes_passwords(client, auth_headers):
+    body = json.dumps({"username": "imported", "password": "plaintext-secret"}) + "\n"
+    assert client.post("/users/import", content=body, headers=auth_headers).json() == {"imported": 1}
+    db = SessionLocal(bind=get_engine())
+    try:
+        assert db.query(User).filter(User.username == "imported").one().password == hash_password("plaintext-secret")
+    finally:
+        db.close()
+
+    response = client.post("/users/import", content=body, headers=auth_headers)
+    assert response.status_code == 400
+    assert "plaintext-secret" not in response.text and "records 1 to 1" in response.text
+    assert "imported" in [user["username"] for user in client.get("/users", headers=auth_headers).json()["users"]]
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+from utils.sessions import Conversation, ConversationManager, InMemorySessionStore
+from utils.tokenizer import CompletionBudget
+
+@pytest.fixture(autouse=True)
+def upstream():
+    # One token per word, and a reply streamed in two chunks
+    with patch("utils.sessions.count_tokens", side_effect=lambda text: len(text.split())), \
+         patch("utils.sessions.plan_completion", return_value=CompletionBudget(0, 64)), \
+         patch("utils.sessions.stream_text", return_value=iter(["Hello", " there"])) as stream_text:
+        yield stream_text
+
+async def _reply(manager, session_id, text):
+    return "".join([chunk async for chunk in manager.reply(session_id, text, "text-davinci-003")])
+
+# Test case for appending turns incrementally and streaming the reply
+def test_reply_appends_turns():
+    manager = ConversationManager(InMemorySessionStore())
+
+    async def run():
+        conversation = await manager.open()
+        assert await _reply(manager, conversation.id, "Hi") == "Hello there"
+        return conversation
+
+    conversation = asyncio.run(run())
+    assert [turn["line"] for turn in conversation.turns] == ["User: Hi\n", "Assistant: Hello there\n"]
+
+# Test case for folding older turns into the rolling summary
+def test_compaction_keeps_context_within_budget(upstream):
+    summarize = Mock(return_value="They greeted each other.")
+    manager = ConversationManager(InMemorySessionStore(), context_tokens=10, keep_turns=2, summarize_fn=summarize)
+
+    async def run():
+        conversation = await manager.open()
+        for text in ("one two three", "four five six", "seven eight nine"):
+            upstream.return_value = iter(["Fine thanks"])
+            await _reply(manager, conversation.id, text)
+        return conversation
+
+    conversation = asyncio.run(run())
+    assert conversation.summary == "They greeted each other."
+    assert "User: one two three\n" in summarize.call_args_list[0][0][0]
+    assert len(conversation.turns) <= 3
+    prompt = upstream.call_args[0][0]
+    assert prompt.startswith("Summary of the conversation so far: They greeted each other.\n")
+    assert prompt.endswith("User: seven eight nine\nAssistant:")
+
+# Test case for the memory budget and idle eviction
+def test_store_evicts_least_recently_used_and_idle():
+    store = InMemorySessionStore(max_bytes=1000, idle_ttl=60)
+
+    async def run():
+        first, second = Conversation("first"), Conversation("second")
+        await store.save(first)
+        await store.save(second)
+        await store.get("first")
+        third = Conversation("third", summary="x" * 500)
+        await store.save(third)
+        assert await store.get("second") is None
+        assert await store.get("first") is first
+
+        first.last_used = 0
+        third.last_used = 0
+        assert await store.evict_idle() == 2
+        assert store.size == 0
+
+    asyncio.run(run())
+
+# Test case for unknown sessions
+def test_unknown_session():
+    manager = ConversationManager(InMemorySessionStore())
+    with pytest.raises(KeyError):
+        asyncio.run(_reply(manager, "missing", "Hi"))
+
+# Test case for restoring the summary and turns when a compacted reply fails
+def test_failed_reply_restores_conversation(upstream):
+    manager = ConversationManager(InMemorySessionStore(), context_tokens=5, keep_turns=1, summarize_fn=Mock(side_effect=lambda text, model: f"Summary of {len(text)} characters."))
+
+    async def run():
+        conversation = await manager.open()
+        for text in ("one two three", "four five six"):
+            upstream.return_value = iter(["Fine thanks"])
+            await _reply(manager, conversation.id, text)
+        summary, turns = conversation.summary, list(conversation.turns)
+        upstream.side_effect = RuntimeError("upstream failed")
+        with pytest.raises(RuntimeError):
+            await _reply(manager, conversation.id, "seven eight nine")
+        return conversation, summary, turns
+
+    conversation, summary, turns = asyncio.run(run())
+    assert (conversation.summary, conversation.turns) == (summary, turns)
@@ -0,0 +1,69 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from utils.tokenizer import Tokenizer, TokenUsage, encoding_for, get_tokenizer, plan_completion
+
+@pytest.fixture(autouse=True)
+def settings():
+    values = SimpleNamespace(GENERATE_MAX_TOKENS=1024, SUMMARY_MAX_TOKENS=1024, SUMMARY_RATIO=0.25, TOKENIZER_ENCODING="cl100k_base")
+    # The approximate tokenizer keeps the test independent of downloadable encodings
+    tokenizer = Tokenizer(encoding_name="unavailable-encoding")
+    with patch("utils.tokenizer.get_settings", return_value=values), patch("utils.tokenizer.get_tokenizer", return_value=tokenizer):
+        yield values
+
+# Test case for memoizing counts of repeated prompt parts
+def test_repeated_parts_are_counted_once():
+    tokenizer = Tokenizer(encoding_name="unavailable-encoding")
+    tokenizer.count_parts("Summarize this text: ", "one two")
+    tokenizer.count_parts("Summarize this text: ", "one two six")
+    info = tokenizer._count_cached.cache_info()
+    assert (info.hits, info.misses) == (1, 3)
+
+# Test case for task budgets
+def test_budgets_follow_task_and_prompt_length():
+    short = "Bonjour le monde"
+    assert plan_completion("gpt-3.5-turbo", "translate", short).max_tokens < 64
+    assert plan_completion("text-davinci-003", "generate", short).max_tokens == 1024
+
+    long_text = "word " * 2000
+    small = plan_completion("text-davinci-003", "summarize", "Summarize this text: ", "word " * 400, input_text="word " * 400)
+    large = plan_completion("text-davinci-003", "summarize", "Summarize this text: ", long_text, input_text=long_text)
+    assert small.max_tokens == 100
+    assert large.max_tokens == 500
+    assert large.prompt_tokens > 2000
+
+# Test case for capping the completion to the model's context
+def test_budget_capped_by_context():
+    budget = plan_completion("text-ada-001", "generate", "word " * 1500)
+    assert budget.prompt_tokens + budget.max_tokens <= 2049
+    with pytest.raises(ValueError):
+        plan_completion("text-ada-001", "generate", "word " * 2040)
+
+# Test case for exposing token counts to accounting code
+def test_usage_is_recorded():
+    usage, seen = TokenUsage(), []
+    usage.subscribe(lambda task, model, budget: seen.append((task, model, budget.prompt_tokens)))
+    with patch("utils.tokenizer.token_usage", usage):
+        plan_completion("text-davinci-003", "generate", "one two six")
+    assert seen == [("generate", "text-davinci-003", 3)]
+    assert usage.totals() == {"generate:text-davinci-003": {"requests": 1, "prompt_tokens": 3, "max_tokens": 1024}}
+
+# Test case for counting an input that is part of the prompt only once
+def test_input_part_counted_once():
+    tokenizer = Tokenizer(encoding_name="unavailable-encoding")
+    text = "word " * 400
+    with patch("utils.tokenizer.get_tokenizer", return_value=tokenizer), patch.object(tokenizer, "count", wraps=tokenizer.count) as count:
+        budget = plan_completion("text-davinci-003", "summarize", "Summarize this text: ", text, input_text=text)
+    assert count.call_count == 2
+    assert budget.max_tokens == 100
+
+# Test case for sharing one tokenizer per encoding of the models
+def test_tokenizer_per_model_encoding():
+    assert encoding_for("text-davinci-003") == "p50k_base"
+    assert encoding_for("text-ada-001") == "r50k_base"
+    assert encoding_for("unknown-model") == encoding_for() == "cl100k_base"
+    with patch("utils.tokenizer.Tokenizer", side_effect=lambda name: Mock(encoding_name=name)) as factory, \
+         patch.dict("utils.tokenizer._tokenizers", clear=True):
+        assert get_tokenizer("text-curie-001") is get_tokenizer("text-ada-001")
+        assert get_tokenizer("text-davinci-003").encoding_name == "p50k_base"
+    assert factory.call_count == 2
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from unittest.mock import Mock
+from utils.embeddings import HashingEmbedder, embed_unique
+from utils.vector_store import VectorStore
+
+# Test case for the local embedder being deterministic and normalized
+def test_hashing_embedder():
+    embedder = HashingEmbedder(dimensions=64)
+    first, second, other = embedder(["the quick brown fox", "the quick brown fox", "a lazy dog"])
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert first @ other < first @ second
+
+# Test case for embedding repeated texts only once
+def test_embed_unique_dedups():
+    embedder = Mock(side_effect=HashingEmbedder(dimensions=8))
+    vectors = embed_unique(["a", "b", "a"], embedder)
+    embedder.assert_called_once_with(["a", "b"])
+    assert np.array_equal(vectors[0], vectors[2])
+
+# Test case for partitioned search matching a brute-force search
+def test_search_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1000, 16)).astype(np.float32)
+    ids = [f"doc{i}" for i in range(1000)]
+    store = VectorStore(str(tmp_path), partition_bytes=64 * 16 * 4)
+    store.add(ids[:600], vectors[:600])
+    store.add(ids[600:], vectors[600:])
+
+    query = rng.standard_normal(16).astype(np.float32)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ query))[:5]
+    results = store.search(query, k=5)
+    assert [vector_id for vector_id, _ in results] == [ids[i] for i in expected]
+    assert results[0][1] >= results[-1][1]
+
+# Test case for replacing vectors and reopening the store
+def test_store_persists_and_updates(tmp_path):
+    store = VectorStore(str(tmp_path))
+    store.add(["a", "b"], np.eye(2, 4))
+    store.add(["a"], [[0, 0, 1, 0]])
+    assert len(store) == 2
+    assert store.search([1, 0, 0, 0], k=2)[0][1] == pytest.approx(0.0)
+    store.close()
+
+    # A vector written without its ID, as after a crash, is dropped
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.ones(4, dtype=np.float32).tobytes())
+    reopened = VectorStore(str(tmp_path))
+    assert len(reopened) == 2 and "a" in reopened
+    assert reopened.search([0, 0, 1, 0], k=1)[0] == ("a", pytest.approx(1.0))
+    assert reopened.search([0, 1, 0, 0], k=1)[0][0] == "b"
+    with pytest.raises(ValueError):
+        reopened.add(["c"], np.ones((1, 3)))
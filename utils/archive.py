@@ -0,0 +1,193 @@
+import asyncio
+import bisect
+import gzip
+import json
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# For logging
+import structlog
+
+logger = structlog.get_logger()
+
+# Index entry of a block: smallest timestamp, largest timestamp, offset and length in the segment
+INDEX_ENTRY = struct.Struct("<ddQI")
+SEGMENT_SUFFIX = ".ndjson.gz"
+INDEX_SUFFIX = ".idx"
+
+
+class ArchiveWriter:
+    """Appends request/response records to compressed, segmented archive files.
+
+    Records are queued by `record` without blocking the request and written by
+    `run` in the background. They are grouped into blocks, each written as an
+    independent gzip member, so a segment is a valid gzip file and any block can
+    be decompressed on its own. Each segment has a compact binary index with
+    one fixed-size entry per block, so a time range can be located by seek.
+
+    Args:
+        directory (str): Directory of the archive segments.
+        segment_size (int): Size in bytes after which a new segment is started.
+        block_size (int): Uncompressed size in bytes of a block.
+        queue_size (int): Records buffered in memory; further records are dropped.
+        flush_interval (float): Longest time in seconds a record stays in an unwritten block.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 64 * 1024 * 1024,
+        block_size: int = 256 * 1024,
+        queue_size: int = 10000,
+        flush_interval: float = 1.0,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._segment: Optional[Path] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, entry: Dict[str, Any]):
+        """Queues a record for writing, dropping it if the buffer is full.
+
+        Args:
+            entry (Dict[str, Any]): The record, with a `ts` timestamp in seconds.
+        """
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Archive buffer full, {self.dropped} records dropped so far")
+
+    def start(self):
+        """Starts writing queued records in a background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """Writes the queued records and stops the background task."""
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    async def run(self):
+        """Writes queued records until `close` is called."""
+        lines: List[bytes] = []
+        size, first_ts, last_ts = 0, float("inf"), float("-inf")
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                entry, timed_out = await asyncio.wait_for(self._queue.get(), timeout), False
+            except asyncio.TimeoutError:
+                entry, timed_out = None, True
+            closing = entry is None and not timed_out
+            if entry is not None:
+                line = json.dumps(entry, ensure_ascii=False, default=str).encode() + b"\n"
+                lines.append(line)
+                size += len(line)
+                first_ts, last_ts = min(first_ts, entry["ts"]), max(last_ts, entry["ts"])
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if lines and (timed_out or closing or size >= self.block_size):
+                try:
+                    await asyncio.to_thread(self._write_block, b"".join(lines), first_ts, last_ts)
+                except OSError as e:
+                    logger.error(f"Error writing archive block of {len(lines)} records: {e}")
+                lines, size, first_ts, last_ts, deadline = [], 0, float("inf"), float("-inf"), None
+            if closing:
+                return
+
+    def _write_block(self, data: bytes, first_ts: float, last_ts: float):
+        if self._segment is None or self._segment.stat().st_size >= self.segment_size:
+            self._segment = self.directory / f"archive-{int(first_ts * 1000):013d}{SEGMENT_SUFFIX}"
+        block = gzip.compress(data, compresslevel=6)
+        with open(self._segment, "ab") as segment:
+            offset = segment.tell()
+            segment.write(block)
+        # The index entry is written last, so a block is only visible once it is complete
+        with open(_index_path(self._segment), "ab") as index:
+            index.write(INDEX_ENTRY.pack(first_ts, last_ts, offset, len(block)))
+
+
+class ArchiveReader:
+    """Reads archived records back in time order of their segments.
+
+    Args:
+        directory (str): Directory of the archive segments.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def segments(self) -> List[Path]:
+        return sorted(self.directory.glob(f"archive-*{SEGMENT_SUFFIX}"))
+
+    def blocks(self, segment: Path, start: Optional[float] = None, end: Optional[float] = None) -> List[Tuple[int, int]]:
+        """Locates the blocks of a segment that may hold records between start and end.
+
+        Args:
+            segment (Path): The segment file.
+            start (Optional[float]): Smallest timestamp to include.
+            end (Optional[float]): Largest timestamp to include.
+
+        Returns:
+            List[Tuple[int, int]]: Offset and length of each block.
+        """
+        try:
+            data = _index_path(segment).read_bytes()
+        except FileNotFoundError:
+            return []
+        entries = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size)]
+
+        # Records of concurrent requests are only roughly ordered, so seek on the running
+        # maximum (every earlier block ends before start) and the trailing minimum
+        # (every later block begins after end), which are both sorted
+        running_max, highest = [], float("-inf")
+        for _, last_ts, _, _ in entries:
+            highest = max(highest, last_ts)
+            running_max.append(highest)
+        trailing_min, lowest = [0.0] * len(entries), float("inf")
+        for i in range(len(entries) - 1, -1, -1):
+            lowest = min(lowest, entries[i][0])
+            trailing_min[i] = lowest
+
+        first = bisect.bisect_left(running_max, start) if start is not None else 0
+        last = bisect.bisect_right(trailing_min, end) if end is not None else len(entries)
+        return [(offset, length) for _, _, offset, length in entries[first:last]]
+
+    def iter_records(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Yields the archived records with a timestamp between start and end.
+
+        Only the blocks found through the index are read, one at a time.
+
+        Args:
+            start (Optional[float]): Smallest timestamp to include.
+            end (Optional[float]): Largest timestamp to include.
+
+        Yields:
+            Dict[str, Any]: The archived records.
+        """
+        for segment in self.segments():
+            blocks = self.blocks(segment, start, end)
+            if not blocks:
+                continue
+            with open(segment, "rb") as file:
+                for offset, length in blocks:
+                    file.seek(offset)
+                    for line in gzip.decompress(file.read(length)).splitlines():
+                        record = json.loads(line)
+                        if (start is None or record["ts"] >= start) and (end is None or record["ts"] <= end):
+                            yield record
+
+
+def _index_path(segment: Path) -> Path:
+    return segment.with_name(segment.name[: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
@@ -0,0 +1,182 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+# For logging
+import structlog
+
+from utils.tokenizer import count_tokens
+
+logger = structlog.get_logger()
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.tokens = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests sharing a key into one upstream call.
+
+    Requests for the same key are collected until the window closes, the batch
+    reaches `max_batch_size` or its items exceed `token_budget`, then sent together
+    through `batch_fn`. The window adapts to the arrival rate of each key: it
+    lasts `WINDOW_INTERVALS` mean inter-arrival times, capped at `max_window`, and
+    when another request is not expected within `max_window` seconds the request
+    is dispatched immediately, so latency at low load is unaffected.
+
+    If the combined call fails or returns the wrong number of results, every item
+    is retried on its own through `single_fn`.
+
+    Args:
+        batch_fn (Callable[[Hashable, List[Any]], Awaitable[List[Any]]]): Processes a batch of items for a key.
+        single_fn (Callable[[Hashable, Any], Awaitable[Any]]): Processes a single item for a key.
+        max_window (float): Longest time in seconds a request waits for others.
+        max_batch_size (int): Largest number of items per batch.
+        token_budget (int): Largest total cost of the items of a batch.
+        cost_fn (Callable[[Any], int]): Returns the cost of an item, in tokens.
+    """
+
+    # Weight of the latest inter-arrival time in the moving average
+    SMOOTHING = 0.2
+
+    # Mean inter-arrival times a batch waits for more requests
+    WINDOW_INTERVALS = 2
+
+    def __init__(
+        self,
+        batch_fn: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        single_fn: Callable[[Hashable, Any], Awaitable[Any]],
+        max_window: float = 0.02,
+        max_batch_size: int = 16,
+        token_budget: int = 2000,
+        cost_fn: Callable[[Any], int] = count_tokens,
+    ):
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.cost_fn = cost_fn
+        self.configure(max_window, max_batch_size, token_budget)
+        self._pending: Dict[Hashable, _PendingBatch] = {}
+        self._arrivals: Dict[Hashable, Tuple[float, float]] = {}  # key -> (last arrival, mean interval)
+        self._tasks: set = set()
+
+    def configure(self, max_window: float, max_batch_size: int, token_budget: int):
+        """Updates the batching limits, e.g. after the settings were reloaded.
+
+        Args:
+            max_window (float): Longest time in seconds a request waits for others.
+            max_batch_size (int): Largest number of items per batch.
+            token_budget (int): Largest total cost of the items of a batch.
+        """
+        self.max_window = max_window
+        self.max_batch_size = max(1, max_batch_size)
+        self.token_budget = token_budget
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """Queues an item and waits for its result.
+
+        Args:
+            key (Hashable): Items are only batched with items of the same key.
+            item (Any): The item to process.
+
+        Returns:
+            Any: The result for this item.
+        """
+        return (await self.submit_many(key, [item]))[0]
+
+    async def submit_many(self, key: Hashable, items: List[Any]) -> List[Any]:
+        """Queues several items arriving together and waits for their results.
+
+        The items are batched with each other and with concurrent requests, even
+        when no other request is expected.
+
+        Args:
+            key (Hashable): Items are only batched with items of the same key.
+            items (List[Any]): The items to process.
+
+        Returns:
+            List[Any]: The results, in the order of `items`.
+        """
+        loop = asyncio.get_running_loop()
+        window = self._record_arrival(key, loop.time())
+        futures = [self._enqueue(key, item, loop) for item in items]
+
+        batch = self._pending.get(key)
+        if batch is not None and batch.timer is None:
+            if window > 0:
+                batch.timer = loop.call_later(window, self._flush, key)
+            else:
+                self._flush(key)
+        return list(await asyncio.gather(*futures))
+
+    def _enqueue(self, key: Hashable, item: Any, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+        future = loop.create_future()
+        cost = self.cost_fn(item)
+
+        batch = self._pending.get(key)
+        if batch is not None and batch.tokens + cost > self.token_budget:
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch()
+
+        batch.items.append(item)
+        batch.futures.append(future)
+        batch.tokens += cost
+
+        if len(batch.items) >= self.max_batch_size or batch.tokens >= self.token_budget:
+            self._flush(key)
+        return future
+
+    def _record_arrival(self, key: Hashable, now: float) -> float:
+        """Updates the mean inter-arrival time of a key and returns how long to wait for more requests, 0 for none."""
+        last, interval = self._arrivals.get(key, (None, float("inf")))
+        if last is not None:
+            elapsed = now - last
+            interval = elapsed if interval == float("inf") else self.SMOOTHING * elapsed + (1 - self.SMOOTHING) * interval
+        self._arrivals[key] = (now, interval)
+        if interval >= self.max_window:
+            return 0.0
+        return min(self.max_window, self.WINDOW_INTERVALS * interval)
+
+    def _flush(self, key: Hashable):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._dispatch(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, key: Hashable, batch: _PendingBatch):
+        if len(batch.items) == 1:
+            await self._run_single(key, batch.items[0], batch.futures[0])
+            return
+        try:
+            results = await self.batch_fn(key, batch.items)
+            if len(results) != len(batch.items):
+                raise ValueError(f"Expected {len(batch.items)} results, got {len(results)}")
+        except Exception as e:
+            logger.warning(f"Batch of {len(batch.items)} items for {key} failed, retrying one by one: {e}")
+            await asyncio.gather(
+                *(self._run_single(key, item, future) for item, future in zip(batch.items, batch.futures))
+            )
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run_single(self, key: Hashable, item: Any, future: asyncio.Future):
+        if future.done():  # The caller went away
+            return
+        try:
+            result = await self.single_fn(key, item)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
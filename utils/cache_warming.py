@@ -0,0 +1,471 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# For logging
+import structlog
+from starlette.concurrency import run_in_threadpool
+
+from utils.helpers import get_cache_data, get_cache_key, set_cache_data
+
+logger = structlog.get_logger()
+
+
+class CountMinSketch:
+    """Approximate access counts of an unbounded set of keys, in fixed memory.
+
+    Estimates never undercount, and overcount by at most e / `width` of all
+    recorded accesses with probability 1 - e ** -`depth`.
+
+    Args:
+        width (int): Counters per row.
+        depth (int): Rows, each with its own hash of the key.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.counts = np.zeros((depth, width), dtype=np.uint32)
+        self._rows = np.arange(depth)
+
+    def _columns(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype="<u4") % self.width
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Records accesses to a key.
+
+        Args:
+            key (str): The key.
+            count (int): Number of accesses.
+
+        Returns:
+            int: The estimated access count of the key.
+        """
+        columns = self._columns(key)
+        self.counts[self._rows, columns] += count
+        return int(self.counts[self._rows, columns].min())
+
+    def estimate(self, key: str) -> int:
+        return int(self.counts[self._rows, self._columns(key)].min())
+
+    def decay(self):
+        """Halves all counts, so popularity follows recent traffic."""
+        self.counts >>= 1
+
+
+class TopK:
+    """The `k` keys with the highest counts, in a min-heap updated lazily.
+
+    Updating a count pushes a new heap entry; entries whose count is outdated are
+    skipped when they reach the top of the heap.
+
+    Args:
+        k (int): Number of keys kept.
+    """
+
+    def __init__(self, k: int = 100):
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.counts
+
+    def offer(self, key: str, count: int) -> Optional[str]:
+        """Updates the count of a key, adding it if it is among the top k.
+
+        Args:
+            key (str): The key.
+            count (int): Its current count.
+
+        Returns:
+            Optional[str]: The key evicted to make room, if any.
+        """
+        evicted = None
+        if key not in self.counts and len(self.counts) >= self.k:
+            while self._heap and self.counts.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap or count <= self._heap[0][0]:
+                return None
+            _, evicted = heapq.heappop(self._heap)
+            del self.counts[evicted]
+        self.counts[key] = count
+        heapq.heappush(self._heap, (count, key))
+        if len(self._heap) > 2 * self.k + 16:
+            self._rebuild()
+        return evicted
+
+    def items(self) -> List[Tuple[str, int]]:
+        """Returns the keys and their counts, most popular first."""
+        return sorted(self.counts.items(), key=lambda item: -item[1])
+
+    def decay(self):
+        """Halves all counts, like `CountMinSketch.decay`."""
+        self.counts = {key: count >> 1 for key, count in self.counts.items()}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+class PopularityTracker:
+    """Counts accesses to cache keys and keeps track of the most popular ones.
+
+    Args:
+        k (int): Number of hot keys tracked.
+        width (int): Counters per row of the count-min sketch.
+        depth (int): Rows of the count-min sketch.
+    """
+
+    def __init__(self, k: int = 100, width: int = 2048, depth: int = 4):
+        self.sketch = CountMinSketch(width, depth)
+        self.top = TopK(k)
+
+    def record(self, key: str, count: int = 1) -> Optional[str]:
+        """Records accesses to a key.
+
+        Args:
+            key (str): The cache key.
+            count (int): Number of accesses.
+
+        Returns:
+            Optional[str]: The key that stopped being hot to make room for this one, if any.
+        """
+        return self.top.offer(key, self.sketch.add(key, count))
+
+    def is_hot(self, key: str) -> bool:
+        return key in self.top
+
+    def hot_keys(self) -> List[Tuple[str, int]]:
+        """Returns the hot keys and their estimated counts, most popular first."""
+        return self.top.items()
+
+    def decay(self):
+        self.sketch.decay()
+        self.top.decay()
+
+
+class TokenBucket:
+    """Allows `rate` operations per second on average, in bursts of up to `capacity`.
+
+    Args:
+        rate (float): Operations per second.
+        capacity (float): Largest burst.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self.configure(rate, capacity)
+
+    def configure(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available.
+
+        Returns:
+            bool: Whether the operation may proceed.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class MemoryCache:
+    """A bounded in-process cache with the part of the Redis client API used by the cache helpers.
+
+    Args:
+        max_entries (int): Largest number of entries; the least recently used are evicted.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and self._get(key) is not None:
+                return False
+            self._entries[key] = (value, time.time() + ex if ex else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class CacheWarmer:
+    """Caches upstream results and keeps the most requested ones warm.
+
+    Results are fresh for `ttl` seconds, then served for up to `stale_ttl` seconds
+    more while they are refreshed in the background (stale-while-revalidate).
+    Accesses are counted by a `PopularityTracker`, and hot entries are refreshed
+    `refresh_ahead` seconds before they expire, so popular requests never wait
+    for the upstream. If `snapshot_path` is set, the hot requests, prompts
+    included, are saved to it, and a new process pre-warms the cache from it.
+    Background refreshes are limited to `refresh_budget` upstream calls per minute.
+
+    Args:
+        get_cache (Callable[[], Any]): Returns the cache, a Redis client or a `MemoryCache`;
+            called per operation so a reloaded REDIS_URL is picked up.
+        ttl (float): Seconds a result is fresh; 0 disables caching.
+        stale_ttl (float): Seconds a stale result may still be served.
+        refresh_ahead (float): Seconds before expiry at which hot entries are refreshed.
+        refresh_budget (float): Background upstream calls per minute.
+        hot_keys (int): Number of hot entries kept warm.
+        snapshot_path (Optional[str]): File of the hot requests, none if None.
+    """
+
+    # Longest time a worker holds the claim on a refresh, so workers sharing a cache refresh an entry once
+    CLAIM_TTL = 30
+
+    def __init__(
+        self,
+        get_cache: Callable[[], Any],
+        ttl: float = 300.0,
+        stale_ttl: float = 60.0,
+        refresh_ahead: float = 30.0,
+        refresh_budget: float = 60.0,
+        hot_keys: int = 100,
+        snapshot_path: Optional[str] = None,
+    ):
+        self.get_cache = get_cache
+        self.snapshot_path = snapshot_path
+        self.tracker = PopularityTracker(hot_keys)
+        self.budget = TokenBucket(*self._budget_limits(refresh_budget))
+        self.configure(ttl, stale_ttl, refresh_ahead, refresh_budget)
+        self._routes: Dict[str, Callable[..., Any]] = {}
+        self._requests: Dict[str, Tuple[str, Dict[str, Any]]] = {}  # Hot key -> (route, params)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tasks: set = set()
+
+    @property
+    def cache(self):
+        return self.get_cache()
+
+    def configure(self, ttl: float, stale_ttl: float, refresh_ahead: float, refresh_budget: float):
+        """Updates the cache lifetimes and the refresh budget, e.g. after the settings were reloaded.
+
+        Args:
+            ttl (float): Seconds a result is fresh; 0 disables caching.
+            stale_ttl (float): Seconds a stale result may still be served.
+            refresh_ahead (float): Seconds before expiry at which hot entries are refreshed.
+            refresh_budget (float): Background upstream calls per minute.
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresh_ahead = refresh_ahead
+        self.budget.configure(*self._budget_limits(refresh_budget))
+
+    @staticmethod
+    def _budget_limits(refresh_budget: float) -> Tuple[float, float]:
+        # Calls per second, in bursts of up to ten seconds of budget
+        return refresh_budget / 60, max(1.0, refresh_budget / 6)
+
+    def register(self, route: str, fn: Callable[..., Any]):
+        """Registers the upstream call whose results are cached under a route name.
+
+        Args:
+            route (str): The route name.
+            fn (Callable[..., Any]): Computes a result from the request parameters, called in the threadpool.
+        """
+        self._routes[route] = fn
+
+    def key_for(self, route: str, params: Dict[str, Any]) -> str:
+        return get_cache_key(f"{route}:{json.dumps(params, sort_keys=True)}")
+
+    async def get(self, route: str, params: Dict[str, Any]) -> Any:
+        """Returns the result of a request, from the cache when possible.
+
+        Args:
+            route (str): The route name.
+            params (Dict[str, Any]): The request parameters, passed to the route's function.
+
+        Returns:
+            Any: The result.
+        """
+        if self.ttl <= 0:
+            return await run_in_threadpool(self._routes[route], **params)
+        key = self.key_for(route, params)
+        self._track(key, route, params)
+        try:
+            entry = await run_in_threadpool(get_cache_data, key, self.cache)
+        except Exception as e:
+            # An unavailable cache must not fail the request, the upstream still answers it
+            logger.warning(f"Error reading the cache for {route}, computing the result: {e}")
+            entry = None
+        if isinstance(entry, dict) and "value" in entry:
+            remaining = entry["expires"] - time.time()
+            if remaining <= 0 or (remaining <= self.refresh_ahead and self.tracker.is_hot(key)):
+                self._refresh_in_background(key, route, params)
+            return entry["value"]
+        return await asyncio.shield(self._start(key, route, params))
+
+    def _track(self, key: str, route: str, params: Dict[str, Any], count: int = 1):
+        evicted = self.tracker.record(key, count)
+        if evicted is not None:
+            self._requests.pop(evicted, None)
+        if self.tracker.is_hot(key):
+            self._requests[key] = (route, params)
+
+    def _start(self, key: str, route: str, params: Dict[str, Any]) -> asyncio.Task:
+        # Concurrent misses and refreshes of a key share one upstream call
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._compute(key, route, params))
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved by the callers, if any are still waiting
+
+    async def _compute(self, key: str, route: str, params: Dict[str, Any]) -> Any:
+        value = await run_in_threadpool(self._routes[route], **params)
+        entry = {"value": value, "expires": time.time() + self.ttl}
+        try:
+            await run_in_threadpool(set_cache_data, key, entry, self.cache, max(1, math.ceil(self.ttl + self.stale_ttl)))
+        except Exception as e:
+            logger.warning(f"Error writing the cache for {route}: {e}")
+        return value
+
+    def _refresh_in_background(self, key: str, route: str, params: Dict[str, Any]) -> bool:
+        if key in self._inflight or not self.budget.try_acquire():
+            return False
+        task = asyncio.ensure_future(self._refresh(key, route, params))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _refresh(self, key: str, route: str, params: Dict[str, Any]):
+        claim = f"{key}:refresh"
+        try:
+            if not await run_in_threadpool(self.cache.set, claim, "1", ex=self.CLAIM_TTL, nx=True):
+                return
+            try:
+                await asyncio.shield(self._start(key, route, params))
+            finally:
+                await run_in_threadpool(self.cache.delete, claim)
+        except Exception as e:
+            logger.warning(f"Error refreshing cache entry for {route}: {e}")
+
+    async def refresh_hot(self) -> int:
+        """Refreshes the hot entries that are missing or about to expire, within the budget.
+
+        Returns:
+            int: The number of refreshes started.
+        """
+        started = 0
+        for key, _ in self.tracker.hot_keys():
+            request = self._requests.get(key)
+            if request is None or key in self._inflight or request[0] not in self._routes:
+                continue
+            entry = await run_in_threadpool(get_cache_data, key, self.cache)
+            expires = entry.get("expires", 0) if isinstance(entry, dict) else 0
+            if expires - time.time() > self.refresh_ahead:
+                continue
+            if not self._refresh_in_background(key, *request):
+                break  # Out of budget; the most popular entries went first
+            started += 1
+        return started
+
+    async def run(self, interval: float = 5.0, decay_interval: float = 300.0, snapshot_interval: float = 60.0):
+        """Refreshes hot entries, decays popularity and saves the snapshot periodically.
+
+        Args:
+            interval (float): Seconds between two refresh rounds.
+            decay_interval (float): Seconds between two halvings of the access counts.
+            snapshot_interval (float): Seconds between two snapshots.
+        """
+        last_decay = last_snapshot = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_hot()
+                now = time.monotonic()
+                if now - last_decay >= decay_interval:
+                    self.tracker.decay()
+                    last_decay = now
+                if self.snapshot_path and now - last_snapshot >= snapshot_interval:
+                    await run_in_threadpool(self.save_snapshot)
+                    last_snapshot = now
+            except Exception as e:
+                logger.error(f"Error warming the cache: {e}")
+
+    def save_snapshot(self):
+        """Saves the hot requests and their counts to `snapshot_path`."""
+        if not self.snapshot_path:
+            return
+        snapshot = [
+            {"route": self._requests[key][0], "params": self._requests[key][1], "count": count}
+            for key, count in self.tracker.hot_keys()
+            if key in self._requests
+        ]
+        temporary = f"{self.snapshot_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(temporary, self.snapshot_path)
+
+    async def prewarm(self) -> int:
+        """Loads the snapshot into the tracker and refreshes its entries, within the budget.
+
+        Entries the budget does not allow yet are refreshed by later rounds of `run`.
+
+        Returns:
+            int: The number of refreshes started.
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return 0
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            for item in snapshot:
+                if item["route"] in self._routes:
+                    self._track(self.key_for(item["route"], item["params"]), item["route"], item["params"], item["count"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring the cache snapshot {self.snapshot_path}: {e}")
+            return 0
+        return await self.refresh_hot()
+
+    async def close(self):
+        """Waits for the background refreshes and saves the snapshot."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await run_in_threadpool(self.save_snapshot)
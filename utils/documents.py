@@ -0,0 +1,263 @@
+import asyncio
+import codecs
+import re
+from collections import deque
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Iterator, List, TypeVar
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.datastructures import UploadFile
+
+from utils.helpers import summarize_text, translate_text
+from utils.tokenizer import DEFAULT_CONTEXT_SIZE, MODEL_CONTEXT_SIZES
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# End of a sentence (with closing quotes or brackets) followed by whitespace, or a blank line
+SENTENCE_END = re.compile(r"[.!?。！？][\"'”’)\]]*\s+|\n\s*\n")
+
+# Bytes read from the spooled document at a time
+READ_SIZE = 64 * 1024
+
+# Room left in a multipart body for the boundaries and headers around the file
+FORM_OVERHEAD = 64 * 1024
+
+
+async def spool_stream(chunks: AsyncIterator[bytes], max_bytes: int, max_memory: int = 1024 * 1024) -> SpooledTemporaryFile:
+    """Writes a streamed body to a temporary file, kept in memory while small.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The body chunks, e.g. `request.stream()`.
+        max_bytes (int): Largest accepted body size.
+        max_memory (int): Size above which the file is moved to disk.
+
+    Returns:
+        SpooledTemporaryFile: The file, positioned at its start.
+
+    Raises:
+        HTTPException: If the body is larger than `max_bytes`.
+    """
+    document = SpooledTemporaryFile(max_size=max_memory)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Document exceeds {max_bytes} bytes")
+            await run_in_threadpool(document.write, chunk)
+    except BaseException:
+        document.close()
+        raise
+    document.seek(0)
+    return document
+
+
+async def spool_upload(request: Request, max_bytes: int, max_memory: int = 1024 * 1024) -> BinaryIO:
+    """Returns the document uploaded in a request, without holding it in memory.
+
+    The document is either the `file` field of a multipart form, which the form
+    parser already spools to disk, or the raw request body. Either way the body is
+    rejected as soon as it is known to be too large, before it is fully received.
+
+    Args:
+        request (Request): The request.
+        max_bytes (int): Largest accepted document size.
+        max_memory (int): Size above which a raw body is moved to disk.
+
+    Returns:
+        BinaryIO: The document, positioned at its start; the caller closes it.
+
+    Raises:
+        HTTPException: If the form has no file or the document is larger than `max_bytes`.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + FORM_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Document exceeds {max_bytes} bytes")
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        limited = Request(request.scope, _limit_receive(request.receive, max_bytes + FORM_OVERHEAD, max_bytes))
+        form = await limited.form(max_files=1, max_fields=10)
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            await form.close()
+            raise HTTPException(status_code=400, detail="Missing file field")
+        if upload.size is not None and upload.size > max_bytes:
+            await form.close()
+            raise HTTPException(status_code=413, detail=f"Document exceeds {max_bytes} bytes")
+        upload.file.seek(0)
+        return upload.file
+    return await spool_stream(request.stream(), max_bytes, max_memory)
+
+
+def _limit_receive(receive, limit: int, max_bytes: int):
+    """Wraps an ASGI receive callable to reject a body once it exceeds `limit` bytes."""
+    size = 0
+
+    async def limited_receive():
+        nonlocal size
+        message = await receive()
+        if message["type"] == "http.request":
+            size += len(message.get("body", b""))
+            if size > limit:
+                raise HTTPException(status_code=413, detail=f"Document exceeds {max_bytes} bytes")
+        return message
+
+    return limited_receive
+
+
+def chunk_size_for(model: str, max_chars: int) -> int:
+    """Returns the chunk size in characters for a model, about half of its context.
+
+    Args:
+        model (str): The OpenAI model.
+        max_chars (int): Upper bound of the chunk size.
+
+    Returns:
+        int: The chunk size in characters.
+    """
+    return min(max_chars, MODEL_CONTEXT_SIZES.get(model, DEFAULT_CONTEXT_SIZE) * 2)
+
+
+def iter_sentence_chunks(document: BinaryIO, max_chars: int, encoding: str = "utf-8") -> Iterator[str]:
+    """Reads a document incrementally and splits it into chunks on sentence boundaries.
+
+    Only about `max_chars` characters plus one read are held in memory at a time.
+    A chunk ends after the last sentence or paragraph that fits; a sentence longer
+    than `max_chars` is split at a space, or hard-split as a last resort.
+
+    Args:
+        document (BinaryIO): The document, read from its current position.
+        max_chars (int): Largest chunk size in characters.
+        encoding (str): Text encoding of the document; undecodable bytes are replaced.
+
+    Yields:
+        str: The chunks, which joined together give back the document.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    while True:
+        data = document.read(READ_SIZE)
+        buffer += decoder.decode(data, final=not data)
+        while len(buffer) >= max_chars:
+            cut = _boundary(buffer, max_chars)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+        if not data:
+            break
+    if buffer.strip():
+        yield buffer
+
+
+def _boundary(text: str, max_chars: int) -> int:
+    cut = 0
+    for match in SENTENCE_END.finditer(text, 0, max_chars):
+        cut = match.end()
+    if cut == 0:
+        cut = text.rfind(" ", 0, max_chars) + 1
+    return cut if cut > 0 else max_chars
+
+
+async def map_ordered(items: AsyncIterator[T], fn: Callable[[T], Awaitable[R]], concurrency: int) -> AsyncIterator[R]:
+    """Applies an async function to a stream with bounded concurrency, keeping the order.
+
+    The next item is only taken from `items` once fewer than `concurrency` calls
+    are pending, so at most that many items are held in memory.
+
+    Args:
+        items (AsyncIterator[T]): The items.
+        fn (Callable[[T], Awaitable[R]]): The function to apply.
+        concurrency (int): Largest number of pending calls.
+
+    Yields:
+        R: The results, in the order of the items.
+    """
+    pending: deque = deque()
+    try:
+        async for item in items:
+            pending.append(asyncio.ensure_future(fn(item)))
+            if len(pending) >= concurrency:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def summarize_document(document: BinaryIO, model: str, max_chars: int, concurrency: int) -> str:
+    """Summarizes a document of any size, one chunk at a time.
+
+    Each chunk is summarized on its own, and summaries are summarized together as
+    soon as they fill a chunk, so only a few chunks of summaries are held however
+    long the document is.
+
+    Args:
+        document (BinaryIO): The document.
+        model (str): The OpenAI model to use.
+        max_chars (int): Largest chunk size in characters.
+        concurrency (int): Largest number of concurrent upstream calls.
+
+    Returns:
+        str: The summary.
+    """
+
+    async def summarize(text: str) -> str:
+        return (await run_in_threadpool(summarize_text, text, model)).strip()
+
+    # Summaries waiting to be combined, per level of the summary tree
+    levels: List[List[str]] = []
+
+    async def add(summary: str, level: int = 0):
+        if level == len(levels):
+            levels.append([])
+        if levels[level] and sum(len(s) + 1 for s in levels[level]) + len(summary) + 1 > max_chars:
+            combined, levels[level] = "\n".join(levels[level]) + "\n", []
+            await add(await summarize(combined), level + 1)
+        levels[level].append(summary)
+
+    chunks = iterate_in_threadpool(iter_sentence_chunks(document, max_chars))
+    async for summary in map_ordered(chunks, summarize, concurrency):
+        await add(summary)
+
+    # Higher levels cover the start of the document
+    summaries = [summary for level in reversed(levels) for summary in level]
+    if not summaries:
+        raise ValueError("The document is empty")
+
+    while len(summaries) > 1:
+        groups: List[str] = [""]
+        for summary in summaries:
+            if groups[-1] and len(groups[-1]) + len(summary) + 1 > max_chars:
+                groups.append("")
+            groups[-1] += summary + "\n"
+        if len(groups) == len(summaries):
+            # Summaries too long to share a chunk are combined in pairs, so every round makes progress
+            groups = ["".join(summary + "\n" for summary in summaries[i : i + 2]) for i in range(0, len(summaries), 2)]
+        summaries = await asyncio.gather(*(summarize(group) for group in groups))
+    return summaries[0]
+
+
+async def translate_document(
+    document: BinaryIO, source_language: str, target_language: str, max_chars: int, concurrency: int
+) -> AsyncIterator[str]:
+    """Translates a document of any size, streaming the translation chunk by chunk.
+
+    Args:
+        document (BinaryIO): The document.
+        source_language (str): The source language code.
+        target_language (str): The target language code.
+        max_chars (int): Largest chunk size in characters.
+        concurrency (int): Largest number of concurrent upstream calls.
+
+    Yields:
+        str: The translation of each chunk, in order, followed by the chunk's trailing whitespace.
+    """
+
+    async def translate(text: str) -> str:
+        translation = await run_in_threadpool(translate_text, text, source_language, target_language)
+        return translation.strip() + text[len(text.rstrip()):]
+
+    chunks = iterate_in_threadpool(iter_sentence_chunks(document, max_chars))
+    async for translation in map_ordered(chunks, translate, concurrency):
+        yield translation
@@ -0,0 +1,98 @@
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+
+from config.config import ReloadableResource
+from utils.helpers import embed_texts
+
+# Words, for the local embedder
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class OpenAIEmbedder:
+    """Embeds texts with the OpenAI embeddings API.
+
+    Args:
+        model (str): The OpenAI embedding model.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(embed_texts(texts, self.model), dtype=np.float32)
+
+
+class HashingEmbedder:
+    """Embeds texts locally by hashing their words and word pairs into a fixed number of dimensions.
+
+    The embeddings are deterministic across processes and need no network access,
+    so they stand in for the upstream in tests and offline development. Texts
+    sharing words get similar embeddings, which is enough to exercise search.
+
+    Args:
+        dimensions (int): Size of the embeddings.
+    """
+
+    model = "local-hashing"
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = WORD_PATTERN.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def _create_embedder(settings):
+    if settings.EMBEDDING_BACKEND == "local":
+        return HashingEmbedder()
+    return OpenAIEmbedder(settings.EMBEDDING_MODEL)
+
+
+_embedder = ReloadableResource(("EMBEDDING_BACKEND", "EMBEDDING_MODEL"), _create_embedder)
+
+
+def get_embedder():
+    """Returns the embedder selected by the settings.
+
+    Returns:
+        OpenAIEmbedder | HashingEmbedder: The shared embedder.
+    """
+    return _embedder.get()
+
+
+def embed_unique(texts: List[str], embedder=None) -> List[np.ndarray]:
+    """Embeds texts, sending each distinct text upstream only once.
+
+    Args:
+        texts (List[str]): The texts to embed, possibly repeated.
+        embedder: The embedder, defaults to the one selected by the settings.
+
+    Returns:
+        List[np.ndarray]: The embeddings, in the order of `texts`.
+    """
+    unique = list(dict.fromkeys(texts))
+    vectors = (embedder or get_embedder())(unique)
+    rows = {text: row for row, text in enumerate(unique)}
+    return [vectors[rows[text]] for text in texts]
+
+
+def text_id(text: str) -> str:
+    """Returns the default vector store ID of a text, a hash of its content.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The ID.
+    """
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
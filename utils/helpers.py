@@ -1,23 +1,22 @@
 import hashlib
 import json
-import os
 import re
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
 
-from api.config import settings
-from openai import OpenAI
+from fastapi import HTTPException
 
-# Import OpenAI library with version 1.52.0
-openai = OpenAI()
-
-# Import configuration settings from config.py
-from api.config import settings
+# Import configuration settings and the shared OpenAI client from config.py
+from config.config import get_openai_client, get_settings
+from utils.tokenizer import plan_completion
 
 # For logging
 import structlog
 
 logger = structlog.get_logger()
 
+# Prompt template of text summarization
+SUMMARY_PROMPT = "Summarize this text: "
+
 def generate_text(text: str, model: str = "text-davinci-003") -> str:
     """Generates text using the OpenAI API.
 
@@ -29,10 +28,11 @@ def generate_text(text: str, model: str = "text-davinci-003") -> str:
         str: The generated text.
     """
     try:
-        response = openai.completions.create(
+        budget = plan_completion(model, "generate", text)
+        response = get_openai_client().completions.create(
             model=model,
             prompt=text,
-            max_tokens=1024,
+            max_tokens=budget.max_tokens,
             temperature=0.7,
             top_p=1.0,
             frequency_penalty=0.0,
@@ -43,9 +43,38 @@ def generate_text(text: str, model: str = "text-davinci-003") -> str:
         logger.error(f"Error generating text: {e}")
         raise HTTPException(status_code=400, detail=f"Error generating text: {e}")
 
+def stream_text(prompt: str, model: str, max_tokens: int, stop: Optional[List[str]] = None) -> Iterator[str]:
+    """Generates text using the OpenAI API, yielding it as it is produced.
+
+    Args:
+        prompt (str): The prompt.
+        model (str): The OpenAI model to use.
+        max_tokens (int): The largest number of tokens to generate.
+        stop (Optional[List[str]]): Sequences that end the generation.
+
+    Yields:
+        str: The generated text, chunk by chunk.
+    """
+    response = get_openai_client().completions.create(
+        model=model,
+        prompt=prompt,
+        max_tokens=max_tokens,
+        temperature=0.7,
+        top_p=1.0,
+        frequency_penalty=0.0,
+        presence_penalty=0.0,
+        stop=stop,
+        stream=True,
+    )
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].text:
+            yield chunk.choices[0].text
+
 def translate_text(text: str, source_language: str, target_language: str) -> str:
     """Translates text from one language to another using the OpenAI API.
 
+    The text goes through the same chat request as a batch of one.
+
     Args:
         text (str): The text to translate.
         source_language (str): The source language code.
@@ -55,17 +84,48 @@ def translate_text(text: str, source_language: str, target_language: str) -> str
         str: The translated text.
     """
     try:
-        response = openai.translations.create(
-            model="gpt-3.5-turbo",
-            input=text,
-            source_language=source_language,
-            target_language=target_language,
-        )
-        return response.translation
+        return translate_texts([text], source_language, target_language)[0]
     except Exception as e:
         logger.error(f"Error translating text: {e}")
         raise HTTPException(status_code=400, detail=f"Error translating text: {e}")
 
+def translate_texts(texts: List[str], source_language: str, target_language: str) -> List[str]:
+    """Translates several texts with a single structured OpenAI request.
+
+    The texts are sent as a JSON array and the model is asked for a JSON array of
+    translations in the same order.
+
+    Args:
+        texts (List[str]): The texts to translate.
+        source_language (str): The source language code.
+        target_language (str): The target language code.
+
+    Returns:
+        List[str]: The translated texts, in the order of `texts`.
+
+    Raises:
+        ValueError: If the reply is not a JSON array of one string per text.
+    """
+    instructions = (
+        f"Translate each string of the JSON array from {source_language} to {target_language}. "
+        "Reply with only a JSON array of the translations, in the same order."
+    )
+    payload = json.dumps(texts, ensure_ascii=False)
+    budget = plan_completion("gpt-3.5-turbo", "translate", instructions, payload, input_text=payload)
+    response = get_openai_client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": payload},
+        ],
+        max_tokens=budget.max_tokens,
+        temperature=0.0,
+    )
+    translations = json.loads(response.choices[0].message.content)
+    if not isinstance(translations, list) or len(translations) != len(texts) or not all(isinstance(t, str) for t in translations):
+        raise ValueError(f"Expected a JSON array of {len(texts)} translations")
+    return translations
+
 def summarize_text(text: str, model: str = "text-davinci-003") -> str:
     """Summarizes a given text using the OpenAI API.
 
@@ -77,10 +137,11 @@ def summarize_text(text: str, model: str = "text-davinci-003") -> str:
         str: The summarized text.
     """
     try:
-        response = openai.completions.create(
+        budget = plan_completion(model, "summarize", SUMMARY_PROMPT, text, input_text=text)
+        response = get_openai_client().completions.create(
             model=model,
-            prompt=f"Summarize this text: {text}",
-            max_tokens=1024,
+            prompt=f"{SUMMARY_PROMPT}{text}",
+            max_tokens=budget.max_tokens,
             temperature=0.7,
             top_p=1.0,
             frequency_penalty=0.0,
@@ -91,6 +152,19 @@ def summarize_text(text: str, model: str = "text-davinci-003") -> str:
         logger.error(f"Error summarizing text: {e}")
         raise HTTPException(status_code=400, detail=f"Error summarizing text: {e}")
 
+def embed_texts(texts: List[str], model: str = "text-embedding-3-small") -> List[List[float]]:
+    """Embeds several texts with a single OpenAI request.
+
+    Args:
+        texts (List[str]): The texts to embed.
+        model (str, optional): The OpenAI embedding model. Defaults to "text-embedding-3-small".
+
+    Returns:
+        List[List[float]]: The embeddings, in the order of `texts`.
+    """
+    response = get_openai_client().embeddings.create(model=model, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
 def hash_password(password: str) -> str:
     """Hashes a password using SHA-256.
 
@@ -149,82 +223,112 @@ def format_response(response: Dict[str, Any]) -> Dict[str, Any]:
             formatted_response[key] = str(value).strip()
     return formatted_response
 
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Parses newline-delimited JSON from a stream of byte chunks, one record at a time.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The byte chunks, e.g. `request.stream()`.
+
+    Yields:
+        Any: The decoded record of each non-empty line.
+
+    Raises:
+        ValueError: If a line is not valid JSON.
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+    if buffer.strip():
+        try:
+            yield json.loads(buffer)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number + 1}: {e}")
+
 def get_api_key() -> str:
-    """Retrieves the OpenAI API key from the environment variables.
+    """Retrieves the OpenAI API key from the settings.
 
     Returns:
         str: The OpenAI API key.
     """
-    api_key = os.environ.get("OPENAI_API_KEY")
+    api_key = get_settings().OPENAI_API_KEY
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable is not set.")
     return api_key
 
 def get_database_url() -> str:
-    """Retrieves the database connection URL from the environment variables.
+    """Retrieves the database connection URL from the settings.
 
     Returns:
         str: The database connection URL.
     """
-    database_url = os.environ.get("DATABASE_URL")
+    database_url = get_settings().DATABASE_URL
     if not database_url:
         raise ValueError("DATABASE_URL environment variable is not set.")
     return database_url
 
 def get_jwt_secret_key() -> str:
-    """Retrieves the JWT secret key from the environment variables.
+    """Retrieves the JWT secret key from the settings.
 
     Returns:
         str: The JWT secret key.
     """
-    secret_key = os.environ.get("SECRET_KEY")
+    secret_key = get_settings().SECRET_KEY
     if not secret_key:
         raise ValueError("SECRET_KEY environment variable is not set.")
     return secret_key
 
 def get_launchdarkly_sdk_key() -> str:
-    """Retrieves the LaunchDarkly SDK key from the environment variables.
+    """Retrieves the LaunchDarkly SDK key from the settings.
 
     Returns:
         str: The LaunchDarkly SDK key.
     """
-    sdk_key = os.environ.get("LAUNCHDARKLY_SDK_KEY")
+    sdk_key = get_settings().LAUNCHDARKLY_SDK_KEY
     if not sdk_key:
         raise ValueError("LAUNCHDARKLY_SDK_KEY environment variable is not set.")
     return sdk_key
 
 def get_launchdarkly_environment_key() -> str:
-    """Retrieves the LaunchDarkly environment key from the environment variables.
+    """Retrieves the LaunchDarkly environment key from the settings.
 
     Returns:
         str: The LaunchDarkly environment key.
     """
-    env_key = os.environ.get("LAUNCHDARKLY_ENV_KEY")
+    env_key = get_settings().LAUNCHDARKLY_ENV_KEY
     if not env_key:
         raise ValueError("LAUNCHDARKLY_ENV_KEY environment variable is not set.")
     return env_key
 
 def get_redis_url() -> str:
-    """Retrieves the Redis connection URL from the environment variables.
+    """Retrieves the Redis connection URL from the settings.
 
     Returns:
         str: The Redis connection URL.
     """
-    redis_url = os.environ.get("REDIS_URL")
+    redis_url = get_settings().REDIS_URL
     if not redis_url:
         raise ValueError("REDIS_URL environment variable is not set.")
     return redis_url
 
 def get_server_port() -> int:
-    """Retrieves the server port from the environment variables.
+    """Retrieves the server port from the settings.
 
     Returns:
         int: The server port.
     """
-    port = os.environ.get("PORT")
+    port = get_settings().PORT
     if not port:
         raise ValueError("PORT environment variable is not set.")
-    return int(port)
+    return port
 
 def get_api_endpoint_url(endpoint: str) -> str:
     """Constructs the full API endpoint URL based on the base URL and the provided endpoint.
@@ -235,7 +339,7 @@ def get_api_endpoint_url(endpoint: str) -> str:
     Returns:
         str: The full API endpoint URL.
     """
-    base_url = settings.API_BASE_URL
+    base_url = get_settings().API_BASE_URL
     return f"{base_url}{endpoint}"
 
 def get_api_endpoint_headers() -> Dict[str, str]:
@@ -245,7 +349,7 @@ def get_api_endpoint_headers() -> Dict[str, str]:
         Dict[str, str]: The API endpoint headers.
     """
     headers = {"Content-Type": "application/json"}
-    auth_token = settings.AUTH_TOKEN
+    auth_token = get_settings().AUTH_TOKEN
     if auth_token:
         headers["Authorization"] = f"Bearer {auth_token}"
     return headers
@@ -279,15 +383,16 @@ def get_cache_data(key: str, cache: Any) -> Optional[Union[str, Dict[str, Any]]]
             return cached_data
     return None
 
-def set_cache_data(key: str, data: Union[str, Dict[str, Any]], cache: Any):
+def set_cache_data(key: str, data: Union[str, Dict[str, Any]], cache: Any, ttl: Optional[int] = None):
     """Stores data in the cache with the provided key.
 
     Args:
         key (str): The cache key.
         data (Union[str, Dict[str, Any]]): The data to cache.
         cache (Any): The cache object (e.g., Redis).
+        ttl (Optional[int]): Seconds after which the cache drops the data, never if None.
     """
-    cache.set(key, json.dumps(data))
+    cache.set(key, json.dumps(data), ex=ttl)
 
 def clear_cache_data(key: str, cache: Any):
     """Removes data from the cache based on the provided key.
@@ -0,0 +1,106 @@
+import asyncio
+import math
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+
+class LoadMonitor:
+    """Samples the event loop lag and counts the requests in flight, to decide which requests to admit.
+
+    The lag is how late a timer fires: when the loop is saturated, every callback
+    waits that long before it runs. It rises to a new sample at once and falls
+    back smoothly, so a single stall is enough to start shedding load.
+
+    Heavy requests (the LLM routes) are shed as soon as the lag passes `max_lag`
+    or `max_in_flight` heavy requests are in flight. Other requests are only shed
+    once the lag passes `critical_lag`, so cheap routes keep working under load.
+
+    Args:
+        max_lag (float): Lag in seconds above which heavy requests are rejected.
+        max_in_flight (int): Heavy requests in flight above which new ones are rejected.
+        critical_lag (float): Lag in seconds above which all requests are rejected.
+        interval (float): Seconds between two lag samples.
+    """
+
+    # Weight of the latest sample when the lag decreases
+    SMOOTHING = 0.2
+
+    def __init__(self, max_lag: float = 0.25, max_in_flight: int = 64, critical_lag: float = 1.0, interval: float = 0.05):
+        self.interval = interval
+        self.lag = 0.0
+        self.in_flight = 0
+        self.heavy_in_flight = 0
+        self.rejected = 0
+        self.configure(max_lag, max_in_flight, critical_lag)
+
+    def configure(self, max_lag: float, max_in_flight: int, critical_lag: float):
+        """Updates the thresholds, e.g. after the settings were reloaded.
+
+        Args:
+            max_lag (float): Lag in seconds above which heavy requests are rejected.
+            max_in_flight (int): Heavy requests in flight above which new ones are rejected.
+            critical_lag (float): Lag in seconds above which all requests are rejected.
+        """
+        self.max_lag = max_lag
+        self.max_in_flight = max_in_flight
+        self.critical_lag = critical_lag
+
+    def record_lag(self, sample: float):
+        self.lag = sample if sample >= self.lag else self.SMOOTHING * sample + (1 - self.SMOOTHING) * self.lag
+
+    async def run(self):
+        """Samples the event loop lag until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record_lag(max(0.0, loop.time() - started - self.interval))
+
+    @property
+    def overloaded(self) -> bool:
+        """Whether heavy requests are being shed."""
+        return self.lag > self.max_lag or self.heavy_in_flight >= self.max_in_flight
+
+    def admit(self, heavy: bool) -> bool:
+        """Decides whether to accept a new request, counting it as rejected otherwise.
+
+        Args:
+            heavy (bool): Whether the request goes to an LLM route.
+
+        Returns:
+            bool: Whether the request may proceed.
+        """
+        admitted = self.lag <= self.critical_lag and not (heavy and self.overloaded)
+        if not admitted:
+            self.rejected += 1
+        return admitted
+
+    @contextmanager
+    def track(self, heavy: bool) -> Iterator[None]:
+        """Counts a request as in flight for the duration of the block.
+
+        Args:
+            heavy (bool): Whether the request goes to an LLM route.
+        """
+        self.in_flight += 1
+        self.heavy_in_flight += heavy
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.heavy_in_flight -= heavy
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying."""
+        return max(1, math.ceil(self.lag * 4))
+
+    def status(self) -> Dict[str, Any]:
+        """Returns the admission state, as reported by the health endpoint."""
+        return {
+            "status": "overloaded" if self.overloaded else "ok",
+            "lag_ms": round(self.lag * 1000, 1),
+            "in_flight": self.in_flight,
+            "heavy_in_flight": self.heavy_in_flight,
+            "rejected": self.rejected,
+        }
@@ -1,10 +1,9 @@
 import logging
-import os
 from typing import Any, Dict, Optional
 
 import structlog
 
-from api.config import settings
+from config.config import get_settings, settings_provider
 
 # Initialize the structlog logger with a custom formatter
 logger = structlog.get_logger(
@@ -13,7 +12,6 @@ logger = structlog.get_logger(
         structlog.processors.format_exc_info,
         structlog.processors.TimeStamper(fmt="iso"),
         structlog.processors.StackInfoRenderer(),
-        structlog.processors.KeyValueRenderer(key_prefix=""),
         structlog.processors.JSONRenderer(),
     ],
     wrapper_class=structlog.stdlib.BoundLogger,
@@ -21,9 +19,22 @@ logger = structlog.get_logger(
     logger_factory=structlog.stdlib.LoggerFactory(),
 )
 
-# Set up the default logging level from environment variable
-log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
-logging.basicConfig(level=getattr(logging, log_level))
+_logging_configured = False
+
+def setup_logging():
+    """Sets the logging level from the settings and applies reloaded levels without restarting the worker.
+
+    Called once at application startup; later calls do nothing.
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+    logging.basicConfig(level=getattr(logging, get_settings().LOG_LEVEL))
+    settings_provider.subscribe(
+        ("LOG_LEVEL",),
+        lambda old, new: logging.getLogger().setLevel(getattr(logging, new.LOG_LEVEL)),
+    )
 
 # Define a custom logger function to handle logging with structlog
 def log(level: str, message: str, context: Optional[Dict[str, Any]] = None):
@@ -0,0 +1,134 @@
+"""Replays archived traffic against a running instance for capacity testing.
+
+Usage:
+    python -m utils.replay ./archive --target http://localhost:8000 --speed 2.0
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import typer
+
+from utils.archive import ArchiveReader
+
+app = typer.Typer(help=__doc__.splitlines()[0])
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Parses a timestamp given in epoch seconds or ISO 8601.
+
+    Args:
+        value (Optional[str]): The timestamp.
+
+    Returns:
+        Optional[float]: The timestamp in epoch seconds.
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def send(session: aiohttp.ClientSession, target: str, record: Dict[str, Any], results: Dict[str, List]):
+    url = f"{target}{record['path']}" + (f"?{record['query']}" if record.get("query") else "")
+    body = record["request"]
+    data = json.dumps(body) if not isinstance(body, str) else body
+    started = time.perf_counter()
+    try:
+        async with session.request(record["method"], url, data=data, headers={"Content-Type": "application/json"}) as response:
+            await response.read()
+            results["statuses"].append(response.status)
+    except aiohttp.ClientError as e:
+        results["errors"].append(str(e))
+        return
+    results["latencies"].append((time.perf_counter() - started) * 1000)
+    results["archived"].append(record.get("duration_ms", 0.0))
+
+
+async def replay_records(
+    archive: str,
+    target: str,
+    start: Optional[float],
+    end: Optional[float],
+    speed: float,
+    concurrency: int,
+) -> Dict[str, List]:
+    results: Dict[str, List] = {"statuses": [], "errors": [], "latencies": [], "archived": [], "skipped": []}
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def limited(record):
+        try:
+            await send(session, target, record, results)
+        finally:
+            semaphore.release()
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
+        first_ts, replay_start = None, time.perf_counter()
+        # Records are streamed from the archive, so memory does not grow with its size
+        for record in ArchiveReader(archive).iter_records(start, end):
+            if record.get("truncated"):
+                # The archived body was cut off, so replaying it would send a different request
+                results["skipped"].append(record["ts"])
+                continue
+            if first_ts is None:
+                first_ts = record["ts"]
+            if speed > 0:
+                delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await semaphore.acquire()
+            task = asyncio.create_task(limited(record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    return results
+
+
+@app.command()
+def replay(
+    archive: str = typer.Argument(..., help="Directory of the archive segments."),
+    target: str = typer.Option("http://localhost:8000", help="Base URL of the instance to replay against."),
+    start: Optional[str] = typer.Option(None, help="Replay records from this time (epoch seconds or ISO 8601)."),
+    end: Optional[str] = typer.Option(None, help="Replay records up to this time (epoch seconds or ISO 8601)."),
+    speed: float = typer.Option(1.0, help="Rate relative to the original traffic, 0 sends as fast as possible."),
+    concurrency: int = typer.Option(100, help="Largest number of requests in flight."),
+):
+    """Streams archived requests to TARGET at the original or a scaled rate."""
+    started = time.perf_counter()
+    results = asyncio.run(replay_records(archive, target.rstrip("/"), parse_time(start), parse_time(end), speed, concurrency))
+    elapsed = time.perf_counter() - started
+
+    sent = len(results["statuses"]) + len(results["errors"])
+    typer.echo(f"Replayed {sent} requests in {elapsed:.1f}s ({sent / elapsed if elapsed else 0:.1f} req/s)")
+    statuses: Dict[int, int] = {}
+    for status in results["statuses"]:
+        statuses[status] = statuses.get(status, 0) + 1
+    typer.echo("Statuses: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    if results["skipped"]:
+        typer.echo(f"Skipped truncated records: {len(results['skipped'])}")
+    if results["errors"]:
+        typer.echo(f"Connection errors: {len(results['errors'])}")
+    for label, key in (("replayed", "latencies"), ("archived", "archived")):
+        values = results[key]
+        typer.echo(
+            f"{label} latency ms: p50 {percentile(values, 0.5):.1f}, p95 {percentile(values, 0.95):.1f}, "
+            f"p99 {percentile(values, 0.99):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    app()
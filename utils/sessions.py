@@ -0,0 +1,246 @@
+import asyncio
+import json
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+# For logging
+import structlog
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from utils.helpers import stream_text, summarize_text
+from utils.tokenizer import count_tokens, plan_completion
+
+logger = structlog.get_logger()
+
+# Stop sequences keeping the model from writing the next user turn itself
+STOP_SEQUENCES = ["\nUser:"]
+
+
+class Conversation:
+    """Server-side state of a conversation: a rolling summary and the recent turns.
+
+    Each turn is stored as the line it contributes to the prompt, with its token
+    count, so the context only grows by the new turn.
+    """
+
+    def __init__(self, session_id: str, summary: str = "", turns: Optional[List[Dict[str, Any]]] = None, last_used: float = 0.0):
+        self.id = session_id
+        self.summary = summary
+        self.turns = turns or []
+        self.last_used = last_used or time.time()
+
+    @property
+    def summary_line(self) -> str:
+        return f"Summary of the conversation so far: {self.summary}\n" if self.summary else ""
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.summary_line) + sum(turn["tokens"] for turn in self.turns)
+
+    @property
+    def size(self) -> int:
+        """Approximate memory footprint in bytes."""
+        return 200 + len(self.summary) + sum(100 + len(turn["line"]) for turn in self.turns)
+
+    def append(self, role: str, content: str):
+        line = f"{role}: {content.strip()}\n"
+        self.turns.append({"line": line, "tokens": count_tokens(line)})
+
+    def prompt_parts(self) -> List[str]:
+        return [self.summary_line] + [turn["line"] for turn in self.turns] + ["Assistant:"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "summary": self.summary, "turns": self.turns, "last_used": self.last_used}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Conversation":
+        return cls(data["id"], data.get("summary", ""), data.get("turns", []), data.get("last_used", 0.0))
+
+
+class InMemorySessionStore:
+    """Keeps conversations in process memory, evicting the least recently used.
+
+    Args:
+        max_bytes (int): Memory budget of all conversations together.
+        idle_ttl (float): Seconds after which an unused conversation is evicted.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, idle_ttl: float = 1800.0):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.size = 0
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+
+    async def get(self, session_id: str) -> Optional[Conversation]:
+        conversation = self._conversations.get(session_id)
+        if conversation is not None:
+            self._conversations.move_to_end(session_id)
+        return conversation
+
+    async def save(self, conversation: Conversation):
+        conversation.last_used = time.time()
+        self.size -= self._sizes.get(conversation.id, 0)
+        self._sizes[conversation.id] = conversation.size
+        self.size += self._sizes[conversation.id]
+        self._conversations[conversation.id] = conversation
+        self._conversations.move_to_end(conversation.id)
+        while self.size > self.max_bytes and len(self._conversations) > 1:
+            self._remove(next(iter(self._conversations)))
+
+    async def delete(self, session_id: str):
+        if session_id in self._conversations:
+            self._remove(session_id)
+
+    async def evict_idle(self) -> int:
+        cutoff, evicted = time.time() - self.idle_ttl, 0
+        # Conversations are ordered by last use, so the idle ones are at the front
+        while self._conversations:
+            session_id, conversation = next(iter(self._conversations.items()))
+            if conversation.last_used >= cutoff:
+                break
+            self._remove(session_id)
+            evicted += 1
+        return evicted
+
+    def _remove(self, session_id: str):
+        self._conversations.pop(session_id)
+        self.size -= self._sizes.pop(session_id, 0)
+
+
+class RedisSessionStore:
+    """Keeps conversations in Redis, shared by all workers; idle ones expire.
+
+    Args:
+        get_client (Callable[[], Any]): Returns the current Redis client, called per operation
+            so a reloaded REDIS_URL is picked up.
+        idle_ttl (float): Seconds after which an unused conversation expires.
+    """
+
+    def __init__(self, get_client: Callable[[], Any], idle_ttl: float = 1800.0, prefix: str = "conversation:"):
+        self.get_client = get_client
+        self.idle_ttl = idle_ttl
+        self.prefix = prefix
+
+    async def get(self, session_id: str) -> Optional[Conversation]:
+        data = await run_in_threadpool(self.get_client().get, self.prefix + session_id)
+        return Conversation.from_dict(json.loads(data)) if data else None
+
+    async def save(self, conversation: Conversation):
+        conversation.last_used = time.time()
+        data = json.dumps(conversation.to_dict())
+        await run_in_threadpool(self.get_client().set, self.prefix + conversation.id, data, ex=int(self.idle_ttl))
+
+    async def delete(self, session_id: str):
+        await run_in_threadpool(self.get_client().delete, self.prefix + session_id)
+
+    async def evict_idle(self) -> int:
+        return 0  # Redis expires idle conversations itself
+
+
+class ConversationManager:
+    """Appends turns to stored conversations and keeps their context within a token budget.
+
+    When a conversation exceeds `context_tokens`, all but the last `keep_turns`
+    turns are folded into its rolling summary.
+
+    Args:
+        store: The session store.
+        context_tokens (int): Token budget of the context sent upstream.
+        keep_turns (int): Number of recent turns kept verbatim when compacting.
+        summarize_fn (Callable[[str, str], str]): Summarizes a text with a model.
+    """
+
+    def __init__(self, store, context_tokens: int = 2048, keep_turns: int = 4, summarize_fn: Callable[[str, str], str] = summarize_text):
+        self.store = store
+        self.context_tokens = context_tokens
+        self.keep_turns = keep_turns
+        self.summarize_fn = summarize_fn
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def open(self, session_id: Optional[str] = None) -> Conversation:
+        """Returns the conversation with the given ID, or a new one.
+
+        Args:
+            session_id (Optional[str]): The ID of an existing conversation.
+
+        Returns:
+            Conversation: The conversation.
+        """
+        conversation = await self.store.get(session_id) if session_id else None
+        if conversation is None:
+            conversation = Conversation(uuid.uuid4().hex)
+            await self.store.save(conversation)
+        return conversation
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def compact(self, conversation: Conversation, model: str):
+        """Folds the older turns into the rolling summary if the context exceeds its budget.
+
+        Args:
+            conversation (Conversation): The conversation.
+            model (str): The OpenAI model used for the summary.
+        """
+        if conversation.tokens <= self.context_tokens or len(conversation.turns) <= self.keep_turns:
+            return
+        older, recent = conversation.turns[: -self.keep_turns], conversation.turns[-self.keep_turns:]
+        text = conversation.summary_line + "".join(turn["line"] for turn in older)
+        conversation.summary = (await run_in_threadpool(self.summarize_fn, text, model)).strip()
+        conversation.turns = recent
+
+    async def reply(self, session_id: str, text: str, model: str) -> AsyncIterator[str]:
+        """Appends a user turn and streams the assistant's reply.
+
+        Turns of one conversation are processed one at a time so they stay in order.
+
+        Args:
+            session_id (str): The ID of the conversation.
+            text (str): The user's message.
+            model (str): The OpenAI model to use.
+
+        Yields:
+            str: The reply, chunk by chunk.
+
+        Raises:
+            KeyError: If the conversation does not exist (anymore).
+        """
+        async with self._lock(session_id):
+            conversation = await self.store.get(session_id)
+            if conversation is None:
+                raise KeyError(f"Unknown session {session_id}")
+            summary, turns = conversation.summary, list(conversation.turns)
+            conversation.append("User", text)
+            try:
+                await self.compact(conversation, model)
+                parts = conversation.prompt_parts()
+                budget = plan_completion(model, "generate", *parts)
+                reply = []
+                async for chunk in iterate_in_threadpool(stream_text("".join(parts), model, budget.max_tokens, STOP_SEQUENCES)):
+                    reply.append(chunk)
+                    yield chunk
+            except BaseException:
+                # Leave the conversation as it was, compaction included, so the client can retry the message
+                conversation.summary, conversation.turns = summary, turns
+                raise
+            conversation.append("Assistant", "".join(reply))
+            await self.store.save(conversation)
+
+    async def sweep(self, interval: float):
+        """Evicts idle conversations periodically.
+
+        Args:
+            interval (float): Seconds between two sweeps.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            evicted = await self.store.evict_idle()
+            if evicted:
+                logger.info(f"Evicted {evicted} idle conversations")
@@ -0,0 +1,262 @@
+import math
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# For logging
+import structlog
+
+# Import configuration settings from config.py
+from config.config import get_settings
+
+logger = structlog.get_logger()
+
+# Context window of each model, in tokens (prompt and completion together)
+MODEL_CONTEXT_SIZES = {
+    "text-davinci-003": 4097,
+    "text-curie-001": 2049,
+    "text-babbage-001": 2049,
+    "text-ada-001": 2049,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_SIZE = 4097
+
+# Smallest completion worth sending upstream; a prompt leaving less room is rejected
+MIN_COMPLETION_TOKENS = 16
+
+# Tokens of the context kept free for message framing and counting differences
+CONTEXT_MARGIN_TOKENS = 64
+
+# Longer prompt parts (whole documents) are counted every time instead of being kept in the cache
+MAX_CACHED_LENGTH = 16 * 1024
+
+# Pieces the approximate tokenizer counts: words, numbers and single punctuation marks
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class CompletionBudget(NamedTuple):
+    """Token counts of an upstream request."""
+
+    prompt_tokens: int
+    max_tokens: int
+
+
+class Tokenizer:
+    """Counts tokens locally, with memoized counts for repeated prompt parts.
+
+    Uses the tiktoken encoding when it can be loaded and otherwise falls back to
+    an approximation (one token per word or punctuation mark, one more per four
+    characters of long words) which is close enough for budgeting.
+
+    Args:
+        encoding_name (str): Name of the tiktoken encoding.
+        cache_size (int): Number of prompt parts whose count is memoized.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", cache_size: int = 4096):
+        self.encoding = None
+        try:
+            import tiktoken
+
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning(f"Tokenizer {encoding_name} unavailable, counting tokens approximately: {e}")
+        self._count_cached = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode_ordinary(text))
+        return sum(1 + (len(piece) - 1) // 4 for piece in _PIECES.findall(text))
+
+    def count(self, text: str) -> int:
+        """Counts the tokens of a text.
+
+        Args:
+            text (str): The text to count.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return self._count_cached(text) if len(text) <= MAX_CACHED_LENGTH else self._count(text)
+
+    def count_parts(self, *parts: str) -> int:
+        """Counts the tokens of a prompt built by concatenating parts.
+
+        Each part is memoized on its own, so a fixed template or an earlier turn of
+        a conversation is only tokenized once. The sum can exceed the count of the
+        joined text by a token per boundary, which errs on the safe side.
+
+        Args:
+            *parts (str): The parts of the prompt.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return sum(self.count(part) for part in parts if part)
+
+
+# Tokenizers of the process, one per encoding, loaded at startup or on first use
+_tokenizers: Dict[str, Tokenizer] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def encoding_for(model: Optional[str] = None) -> str:
+    """Returns the name of the tiktoken encoding of a model.
+
+    Args:
+        model (Optional[str]): The OpenAI model, or None for the configured default.
+
+    Returns:
+        str: The encoding of the model, `TOKENIZER_ENCODING` if it is unknown.
+    """
+    if model:
+        try:
+            from tiktoken.model import encoding_name_for_model
+
+            return encoding_name_for_model(model)
+        except Exception:
+            pass
+    return get_settings().TOKENIZER_ENCODING
+
+
+def get_tokenizer(model: Optional[str] = None) -> Tokenizer:
+    """Returns the shared tokenizer of a model's encoding, loaded on first use.
+
+    Loading an encoding can download it, so `load_tokenizers` should run at
+    startup, off the event loop.
+
+    Args:
+        model (Optional[str]): The OpenAI model, or None for the configured default encoding.
+
+    Returns:
+        Tokenizer: The shared tokenizer.
+    """
+    encoding_name = encoding_for(model)
+    tokenizer = _tokenizers.get(encoding_name)
+    if tokenizer is None:
+        with _tokenizers_lock:
+            tokenizer = _tokenizers.get(encoding_name)
+            if tokenizer is None:
+                tokenizer = _tokenizers[encoding_name] = Tokenizer(encoding_name)
+    return tokenizer
+
+
+def load_tokenizers():
+    """Loads the tokenizers of the known models and of the default encoding."""
+    get_tokenizer()
+    for model in MODEL_CONTEXT_SIZES:
+        get_tokenizer(model)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Counts the tokens of a text with the shared tokenizer.
+
+    Args:
+        text (str): The text to count.
+        model (Optional[str]): The OpenAI model, or None for the configured default encoding.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return get_tokenizer(model).count(text)
+
+
+def _generation_budget(input_tokens: int) -> int:
+    return get_settings().GENERATE_MAX_TOKENS
+
+
+def _translation_budget(input_tokens: int) -> int:
+    # Translations are about as long as their input; leave room for scripts that need more tokens
+    return math.ceil(input_tokens * 1.5) + 16
+
+
+def _summary_budget(input_tokens: int) -> int:
+    settings = get_settings()
+    return max(64, min(settings.SUMMARY_MAX_TOKENS, math.ceil(input_tokens * settings.SUMMARY_RATIO)))
+
+
+# Completion budget of each task from the number of input tokens
+TASK_BUDGETS: Dict[str, Callable[[int], int]] = {
+    "generate": _generation_budget,
+    "translate": _translation_budget,
+    "summarize": _summary_budget,
+}
+
+
+class TokenUsage:
+    """Accumulates the tokens sent upstream, for rate limiting and accounting.
+
+    Listeners registered with `subscribe` are called with the task, the model and
+    the budget of every planned request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0, 0])
+        self._listeners: List[Callable[[str, str, CompletionBudget], Any]] = []
+
+    def subscribe(self, callback: Callable[[str, str, CompletionBudget], Any]):
+        self._listeners.append(callback)
+
+    def record(self, task: str, model: str, budget: CompletionBudget):
+        with self._lock:
+            totals = self._totals[(task, model)]
+            totals[0] += 1
+            totals[1] += budget.prompt_tokens
+            totals[2] += budget.max_tokens
+        for callback in self._listeners:
+            try:
+                callback(task, model, budget)
+            except Exception as e:
+                logger.error(f"Error in token usage listener: {e}")
+
+    def totals(self) -> Dict[str, Dict[str, int]]:
+        """Returns the requests, prompt tokens and reserved completion tokens of each task and model."""
+        with self._lock:
+            return {
+                f"{task}:{model}": {"requests": r, "prompt_tokens": p, "max_tokens": m}
+                for (task, model), (r, p, m) in self._totals.items()
+            }
+
+
+token_usage = TokenUsage()
+
+
+def plan_completion(model: str, task: str, *prompt_parts: str, input_text: Optional[str] = None) -> CompletionBudget:
+    """Counts the prompt tokens of a request and sizes its max_tokens.
+
+    Tokens are counted with the model's own encoding. The completion gets the
+    budget of the task, computed from the tokens of the input text, capped by the
+    room the prompt leaves in the model's context less `CONTEXT_MARGIN_TOKENS`.
+
+    Args:
+        model (str): The OpenAI model.
+        task (str): One of "generate", "translate" or "summarize".
+        *prompt_parts (str): The parts of the prompt, e.g. a template and the input text.
+        input_text (Optional[str]): The text the budget is proportional to, the whole prompt by default.
+
+    Returns:
+        CompletionBudget: The prompt tokens and the max_tokens to request.
+
+    Raises:
+        ValueError: If the prompt does not leave room for a completion in the model's context.
+    """
+    tokenizer = get_tokenizer(model)
+    part_tokens = [tokenizer.count(part) if part else 0 for part in prompt_parts]
+    prompt_tokens = sum(part_tokens)
+    if input_text is None:
+        input_tokens = prompt_tokens
+    elif input_text in prompt_parts:
+        # The input is usually a part of the prompt, too long to be memoized, so its count is reused
+        input_tokens = part_tokens[prompt_parts.index(input_text)]
+    else:
+        input_tokens = tokenizer.count(input_text)
+    context_size = MODEL_CONTEXT_SIZES.get(model, DEFAULT_CONTEXT_SIZE)
+    available = context_size - CONTEXT_MARGIN_TOKENS - prompt_tokens
+    if available < MIN_COMPLETION_TOKENS:
+        raise ValueError(f"Prompt of {prompt_tokens} tokens does not fit in the {context_size}-token context of {model}")
+    budget = CompletionBudget(prompt_tokens, max(MIN_COMPLETION_TOKENS, min(available, TASK_BUDGETS[task](input_tokens))))
+    token_usage.record(task, model, budget)
+    return budget
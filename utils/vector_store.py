@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# For logging
+import structlog
+
+logger = structlog.get_logger()
+
+# Bytes of vectors scored at a time by a search
+DEFAULT_PARTITION_BYTES = 64 * 1024 * 1024
+
+
+class VectorStore:
+    """Float32 vectors in a memory-mapped file, with an index from IDs to rows.
+
+    `vectors.f32` holds the rows back to back and `ids.txt` the ID of each row,
+    one per line. Both are append-only, except that adding an existing ID
+    overwrites its row. The ID is written after its vector, so a row torn by a
+    crash is dropped when the store is opened again.
+
+    Vectors are normalized when added, so search scores are cosine similarities.
+    Searches score the store one partition at a time, so the store can be larger
+    than memory and is paged in by the operating system as it is read.
+
+    Args:
+        directory (str): Directory of the store, created on the first write.
+        partition_bytes (int): Bytes of vectors scored at a time by a search.
+    """
+
+    def __init__(self, directory: str, partition_bytes: int = DEFAULT_PARTITION_BYTES):
+        self.directory = directory
+        self.partition_bytes = partition_bytes
+        self.dimensions: Optional[int] = None
+        self.rows = 0
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def _ids_path(self) -> str:
+        return os.path.join(self.directory, "ids.txt")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, encoding="utf-8") as f:
+            self.dimensions = json.load(f)["dimensions"]
+        ids = []
+        if os.path.exists(self._ids_path):
+            with open(self._ids_path, encoding="utf-8") as f:
+                ids = f.read().splitlines()
+        row_size = self.dimensions * 4
+        stored = os.path.getsize(self._vectors_path) // row_size if os.path.exists(self._vectors_path) else 0
+        self.rows = min(len(ids), stored)
+        if self.rows < len(ids) or os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) != self.rows * row_size:
+            logger.warning(f"Dropping incomplete rows of the vector store in {self.directory}")
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(self.rows * row_size)
+            with open(self._ids_path, "w", encoding="utf-8") as f:
+                f.writelines(f"{vector_id}\n" for vector_id in ids[: self.rows])
+        self._ids = ids[: self.rows]
+        self._index = {vector_id: row for row, vector_id in enumerate(self._ids)}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __contains__(self, vector_id: str) -> bool:
+        return vector_id in self._index
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Adds vectors, replacing those of IDs already in the store.
+
+        Args:
+            ids (List[str]): The IDs of the vectors.
+            vectors (np.ndarray): The vectors, one row per ID.
+
+        Raises:
+            ValueError: If the IDs and vectors do not match, or the vectors have another size than the store's.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(ids) != len(vectors):
+            raise ValueError(f"Expected {len(ids)} vectors, got an array of shape {vectors.shape}")
+        if any(not vector_id or "\n" in vector_id for vector_id in ids):
+            raise ValueError("IDs must be non-empty and on a single line")
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            if self.dimensions is None:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dimensions": vectors.shape[1]}, f)
+                self.dimensions = vectors.shape[1]
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected vectors of {self.dimensions} dimensions, got {vectors.shape[1]}")
+
+            # The last vector of a repeated ID wins
+            positions = dict(zip(ids, range(len(ids))))
+            updates = [(self._index[vector_id], position) for vector_id, position in positions.items() if vector_id in self._index]
+            appends = [(vector_id, position) for vector_id, position in positions.items() if vector_id not in self._index]
+
+            if updates:
+                with open(self._vectors_path, "r+b") as f:
+                    for row, position in updates:
+                        f.seek(row * self.dimensions * 4)
+                        f.write(vectors[position].tobytes())
+            if appends:
+                with open(self._vectors_path, "ab") as f:
+                    f.write(vectors[[position for _, position in appends]].tobytes())
+                with open(self._ids_path, "a", encoding="utf-8") as f:
+                    f.writelines(f"{vector_id}\n" for vector_id, _ in appends)
+                for vector_id, _ in appends:
+                    self._index[vector_id] = self.rows
+                    self._ids.append(vector_id)
+                    self.rows += 1
+
+    def _snapshot(self) -> Tuple[Optional[np.memmap], int]:
+        with self._lock:
+            rows = self.rows
+            if rows and (self._vectors is None or len(self._vectors) != rows):
+                self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+            return self._vectors, rows
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        """Returns the IDs of the vectors most similar to a query.
+
+        Args:
+            query (np.ndarray): The query vector.
+            k (int): Number of results.
+
+        Returns:
+            List[Tuple[str, float]]: IDs and cosine similarities, most similar first.
+
+        Raises:
+            ValueError: If the query has another size than the store's vectors.
+        """
+        vectors, rows = self._snapshot()
+        if not rows or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if len(query) != self.dimensions:
+            raise ValueError(f"Expected a query of {self.dimensions} dimensions, got {len(query)}")
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        k = min(k, rows)
+        step = max(k, self.partition_bytes // (self.dimensions * 4))
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, rows, step):
+            scores = vectors[start:start + step] @ query
+            top = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if len(best_scores) > k:
+                keep = np.argpartition(best_scores, -k)[-k:]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores, kind="stable")
+        return [(self._ids[best_rows[i]], float(best_scores[i])) for i in order]
+
+    def close(self):
+        """Releases the memory map of the vectors."""
+        with self._lock:
+            self._vectors = None